@@ -1,6 +1,5 @@
 import _thread
 import ssl
-from datetime import datetime
 
 import elastic_transport
 import elasticsearch
@@ -10,10 +9,14 @@ import streamlit as st
 from loguru import logger
 from sidhulabs.elastic.client import get_elastic_client
 
-from real_estate_hub.config import Config
+from real_estate_hub.compare import align_profiles, fetch_profiles, pivot_section, plot_section
 from real_estate_hub.data_feeds.google_geo import GoogleGeo
 from real_estate_hub.data_feeds.location_stats import LocationStatsGenerator
+from real_estate_hub.data_feeds.nearby_places_index import NearbyPlacesIndex, get_nearby_places_index
 from real_estate_hub.data_feeds.web.zolo_scraper import ZoloScraper
+from real_estate_hub.location_aliases import LocationAliasIndex
+from real_estate_hub.payload_store import PayloadStore
+from real_estate_hub.profiles import LocationNotFoundError, ProfileUnavailableError, lookup_profile
 
 st.set_page_config(layout="wide", page_title="Real Estate Hub")
 st.title("Sidhu Lab's Real Estate Hub")
@@ -39,77 +42,95 @@ def get_es_client() -> elasticsearch.Elasticsearch:
     return get_elastic_client("https://elastic.sidhulabs.ca:443")
 
 
+@st.cache(hash_funcs={elasticsearch.Elasticsearch: id}, allow_output_mutation=True)
+def create_indices(es_client: elasticsearch.Elasticsearch):
+    """Creates the alias and payload indices the lookups write to, once per app process."""
+
+    LocationAliasIndex(es_client).create_index()
+    PayloadStore(es_client).create_index()
+
+
 @st.cache(show_spinner=True)
 def get_zolo_scraper(address: str) -> ZoloScraper:
     logger.info(f"Getting data for {address} from Zolo")
     return ZoloScraper(address)
 
 
-@st.cache(show_spinner=True)
+@st.cache(allow_output_mutation=True)
+def get_places_index() -> NearbyPlacesIndex:
+    return get_nearby_places_index()
+
+
+@st.cache(show_spinner=True, hash_funcs={NearbyPlacesIndex: id})
 def get_google_directions(location: str, lat: float = None, long: float = None) -> GoogleGeo:
-    return GoogleGeo(location, lat=lat, long=long)
+    return GoogleGeo(location, lat=lat, long=long, places_index=get_places_index())
 
 
 es_client = get_es_client()
+create_indices(es_client)
 
-existing_es_doc = False
-non_existing_es_doc = False
-update_doc = False
+if st.sidebar.radio("Mode", ["Single Location", "Compare Locations"]) == "Compare Locations":
 
-if location := st.text_input("Address, City, or Postal Code"):
+    locations_input = st.text_area("Locations to compare, one per line")
+    compare_locations = list(dict.fromkeys(line.strip() for line in locations_input.splitlines() if line.strip()))
 
-    results = es_client.search(
-        index=Config.ELASTICSEARCH_INDEX,
-        size=1,
-        sort=[{"location_stats.asof_date": {"order": "desc"}}],
-        query={
-            "bool": {
-                "must": [{"match_phrase": {"location": f"{location}"}}],
-                "filter": [{"range": {"processed_date": {"gte": "now-31d"}}}],
-            }
-        },
-    )
-
-    # If we have a hit for a location in Elasticsearch, get the latitude and longitude for it
-    # Else get the latitude and longitude for the location from the Google API
-    if results["hits"]["hits"]:
-        logger.info(f"Found results for location {location} in Elasticsearch!")
-
-        existing_es_doc = True
-        lat, long = (
-            results["hits"]["hits"][0]["_source"]["latitude"],
-            results["hits"]["hits"][0]["_source"]["longitude"],
-        )
-        google_directions = get_google_directions(location, lat, long)
-    else:
-        logger.info(f"No results found for location {location} in Elasticsearch!")
-
-        non_existing_es_doc = True
-
-        try:
-            google_directions = get_google_directions(location)
-            lat, long = google_directions.lat, google_directions.long
-        except Exception as e:
-            logger.error(f"Error getting location data from Google for {location}: {e}")
-            st.error("Address not found!")
+    if compare_locations:
+        profiles = fetch_profiles(es_client, compare_locations)
+
+        if missing := [location for location in compare_locations if location not in profiles]:
+            st.warning(f"No profiles found for {', '.join(missing)}, search for them individually first.")
+
+        if not profiles:
             st.stop()
 
-    logger.info(f"Lat,Long: {lat}, {long}")
-    st.subheader(f"Location Stats for {location.title()}")
-    st.map(pd.DataFrame({"lat": [lat], "lon": [long]}))
+        stats = align_profiles(profiles)
+
+        st.subheader(f"Comparing {len(profiles)} Locations")
+        st.map(stats.drop_duplicates(subset="location")[["latitude", "longitude"]].set_axis(["lat", "lon"], axis=1))
+
+        # General Stats
+        st.table(pivot_section(stats, "general_stats", values="value"))
+
+        for section, title in [
+            ("income", "Household Income"),
+            ("age_distribution", "Population by Age Group"),
+            ("education", "Education Level"),
+            ("rent_or_owned", "Proportion of rentals vs. owned Properties"),
+            ("age_of_home_distribution", "Home Built by Year"),
+            ("children_at_home", "Age of Children"),
+            ("marital_status", "Marital Status"),
+            ("occupations", "Jobs"),
+        ]:
+            st.plotly_chart(plot_section(stats, section, title), use_container_width=True)
+
+    st.stop()
+
+if location := st.text_input("Address, City, or Postal Code"):
 
-    # If location stats aren't in Elasticsearch, get it from the API
     try:
-        loc_stats = LocationStatsGenerator(
-            lat, long, location_data=results["hits"]["hits"][0]["_source"]["location_stats"]
+        lookup = lookup_profile(
+            es_client, location, get_places_index(), get_google_directions, get_location_data, get_zolo_scraper
+        )
+    except LocationNotFoundError:
+        st.error("Address not found!")
+        st.stop()
+    except ProfileUnavailableError:
+        st.error("Our data providers are unavailable right now, please try again in a few minutes.")
+        st.stop()
+
+    profile = lookup["profile"]
+    lat, long = profile["latitude"], profile["longitude"]
+    loc_stats = lookup["location_stats"]
+
+    if lookup["stale"]:
+        st.warning(
+            f"Our data providers are unavailable right now, showing data last updated on "
+            f"{str(profile['processed_date'])[:10]}. It will be refreshed in the background once they're back."
         )
 
-        logger.info(f"Using location stats from Elasticsearch for {location}")
-    except (IndexError, KeyError) as e:
-        logger.info(f"No location stats found in Elasticsearch for {location}")
-
-        update_doc = True
-        loc_stats = get_location_data(lat, long)
+    logger.info(f"Lat,Long: {lat}, {long}")
+    st.subheader(f"Location Stats for {location.title()}")
+    st.map(pd.DataFrame({"lat": [lat], "lon": [long]}))
 
     with st.expander(f"Neighbourhood Info as of {loc_stats.as_of_date}", expanded=True):
         col1, col2 = st.columns(2)
@@ -179,34 +200,13 @@ if location := st.text_input("Address, City, or Postal Code"):
             # Job Info
             st.table(loc_stats.get_occupations().rename(columns={"key": "Job", "value": "Number of People"}))
 
-    # If nearby places aren't in Elasticsearch, get it from the API
-    try:
-        nearby_places = results["hits"]["hits"][0]["_source"]["nearby_places"]
-
-        logger.info(f"Using nearby places from Elasticsearch for {location}")
-    except (IndexError, KeyError) as e:
-        logger.info(f"No nearby places found in Elasticsearch for {location}")
-
-        update_doc = True
-        nearby_places = google_directions.get_nearby_places()
+    nearby_places = profile["nearby_places"]
 
     if nearby_places:
         with st.expander("Nearby Places"):
             st.table(pd.DataFrame(nearby_places).drop_duplicates(subset="Name").reset_index(drop=True))
 
-    # If commute times aren't in Elasticsearch, get it from the API
-    try:
-        commute_times = results["hits"]["hits"][0]["_source"]["commute_times"]
-
-        logger.info(f"Using commute times from Elasticsearch for {location}")
-    except (IndexError, KeyError) as e:
-        logger.info(f"No commute times found in Elasticsearch for {location}")
-
-        update_doc = True
-        commute_times = {
-            "driving_commute_time": google_directions.get_commute_time("driving"),
-            "transit_commute_time": google_directions.get_commute_time("transit"),
-        }
+    commute_times = profile["commute_times"]
 
     with st.expander("Commute Times"):
         col1, col2 = st.columns(2)
@@ -217,29 +217,9 @@ if location := st.text_input("Address, City, or Postal Code"):
             st.metric("Transit to Union", commute_times["transit_commute_time"])
 
     # Zolo stuff
-    zolo_info = get_zolo_scraper(location)
-    sold_history = zolo_info.get_sold_history()
-    if sold_history is not None:
+    if lookup["sold_history_unavailable"]:
+        st.warning("Sold history is unavailable right now.")
+
+    if lookup["sold_history"] is not None:
         with st.expander("Sold History"):
-            st.table(sold_history)
-
-    doc = {
-        "location": location,
-        "latitude": lat,
-        "longitude": long,
-        "location_stats": loc_stats.location_data,
-        "nearby_places": nearby_places,
-        "commute_times": commute_times,
-        "processed_date": datetime.now(),
-    }
-
-    # Create new Elasticsearch document if the search is new
-    if non_existing_es_doc:
-        logger.info(f"Inserting new doc for for {location} into Elasticsearch")
-        es_client.index(index=Config.ELASTICSEARCH_INDEX, document=doc)
-
-    # Update existing Elasticsearch document if some data is missing
-    if existing_es_doc and update_doc:
-        logger.info(f"Updating existing doc for {location} in Elasticsearch")
-
-        es_client.index(index=Config.ELASTICSEARCH_INDEX, document=doc, id=results["hits"]["hits"][0]["_id"])
+            st.table(lookup["sold_history"])
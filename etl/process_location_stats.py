@@ -1,18 +1,25 @@
 import os
-from collections import deque
 from datetime import datetime
 from typing import Any, Dict, List
 
 import prefect
 from elasticsearch import Elasticsearch
 from elasticsearch.helpers import parallel_bulk
-from prefect import Flow, Parameter, task
+from prefect import Flow, Parameter, task, unmapped
+from prefect.executors import DaskExecutor, LocalDaskExecutor
 from prefect.run_configs import KubernetesRun
 from prefect.storage import Docker
 from sidhulabs.elastic.client import get_elastic_client
 
-from real_estate_hub.data_feeds.google_geo import GoogleGeo
-from real_estate_hub.data_feeds.location_stats import LocationStatsGenerator
+from real_estate_hub import sharding
+from real_estate_hub.config import Config
+from real_estate_hub.data_feeds.batch_geocoder import BatchGeocoder
+from real_estate_hub.data_feeds.nearby_places_index import get_nearby_places_index
+from real_estate_hub.export import export_location_docs
+from real_estate_hub.location_aliases import LocationAliasIndex
+from real_estate_hub.payload_store import PayloadStore
+from real_estate_hub.profiles import build_profile
+from real_estate_hub.quota import QuotaLease, QuotaPlanner
 
 DOCKER_IMAGE = "bigsidhu/real-estate-hub"
 
@@ -20,79 +27,244 @@ storage = Docker(
     registry_url=DOCKER_IMAGE.split("/")[0], image_name=DOCKER_IMAGE.split("/")[1], dockerfile="./Dockerfile"
 )
 
+# Volume the app and the ETL share the quota lease and usage ledger on, see manifests/real-estate-hub-data-pvc.yaml
+SHARED_DATA_VOLUME = "real-estate-hub-data"
+SHARED_DATA_PATH = "/data/real-estate-hub"
+
 run_config = KubernetesRun(
     image=f"{DOCKER_IMAGE}:{storage.image_tag}",
+    job_template={
+        "apiVersion": "batch/v1",
+        "kind": "Job",
+        "spec": {
+            "template": {
+                "spec": {
+                    "containers": [
+                        {"name": "flow", "volumeMounts": [{"name": SHARED_DATA_VOLUME, "mountPath": SHARED_DATA_PATH}]}
+                    ],
+                    "volumes": [
+                        {"name": SHARED_DATA_VOLUME, "persistentVolumeClaim": {"claimName": SHARED_DATA_VOLUME}}
+                    ],
+                }
+            }
+        },
+    },
     env={
         "GOOGLE_API_KEY": os.environ.get("GOOGLE_API_KEY"),
         "RAPID_API_KEY": os.environ.get("RAPID_API_KEY"),
         "ELASTIC_API_ID": os.environ.get("ELASTIC_API_ID"),
         "ELASTIC_API_KEY": os.environ.get("ELASTIC_API_KEY"),
+        "QUOTA_LEASE_PATH": os.environ.get("QUOTA_LEASE_PATH", f"{SHARED_DATA_PATH}/quota_lease.json"),
+        "API_USAGE_LEDGER_PATH": os.environ.get("API_USAGE_LEDGER_PATH", f"{SHARED_DATA_PATH}/api_usage.jsonl"),
+        "DASK_SCHEDULER_ADDRESS": os.environ.get("DASK_SCHEDULER_ADDRESS"),
     },
 )
 
+# Shards run on an external Dask cluster when one is available so they can spread over pods, else on local processes.
+# Dask workers on other pods need the shared volume mounted at SHARED_DATA_PATH too to split the API quotas with the
+# flow's pod and the app.
+if os.environ.get("DASK_SCHEDULER_ADDRESS"):
+    executor = DaskExecutor(address=os.environ["DASK_SCHEDULER_ADDRESS"])
+else:
+    executor = LocalDaskExecutor(scheduler="processes")
+
 
 @task
-def test_es_client(es_client: Elasticsearch):
-    """Test ES Connection."""
+def test_es_client():
+    """
+    Test ES Connection.
+
+    Every task builds its own client since the client can't be pickled to pass between processes.
+    """
 
     logger = prefect.context.get("logger")
 
-    logger.info(es_client.info(pretty=True))
+    logger.info(get_elastic_client("https://elastic.sidhulabs.ca:443").info(pretty=True))
 
 
 @task
-def get_data(locations: List[str]) -> List[Dict[str, Any]]:
+def get_data(
+    locations: List[str], quota_lease: QuotaLease = None, alias_index: LocationAliasIndex = None
+) -> List[Dict[str, Any]]:
     """
     Gets location data for each location in the list.
 
     Adds metadata to the data such as the date the data was processed, the as of date for the stats and the location.
+    If a quota lease is passed in, the API calls for geocoding and each location are reserved first and released once
+    they're made, and the rest of the locations are skipped once the quota is used up. If an alias index is passed in,
+    locations it already knows aren't geocoded and locations geocoded exactly are registered in it, FSA centroids
+    aren't since a whole area shares them. Locations whose data can't be fetched, i.e because an upstream API is down,
+    are skipped and picked up next run.
     """
 
     logger = prefect.context.get("logger")
 
+    aliases = alias_index.resolve_many(locations) if alias_index else {}
+    coordinates = {location: (alias["latitude"], alias["longitude"]) for location, alias in aliases.items()}
+
+    # Geocode everything else up front so duplicate and previously seen locations don't cost extra API calls
+    geocoder = BatchGeocoder(quota_lease=quota_lease)
+    geocodes = geocoder.geocode([location for location in locations if location not in coordinates])
+    logger.info(f"Geocoded {len(locations)} locations with {geocoder.api_calls} Google Geocoding API calls")
+
+    for location, geocode in geocodes.items():
+        coordinates[location] = (geocode["latitude"], geocode["longitude"]) if geocode else None
+
+        if alias_index and geocode and geocode["exact"]:
+            alias_index.register(
+                [location], geocode["latitude"], geocode["longitude"], formatted_address=geocode["formatted_address"]
+            )
+
+    places_index = get_nearby_places_index()
+    planner = QuotaPlanner(places_index=places_index)
+
     data = []
-    # Not parallel since I'm cheap and using a free API which has a request limit :)
-    for location in locations:
+    # Sequential within a shard since I'm cheap and using a free API which has a request limit :)
+    for location in dict.fromkeys(locations):
+        if not coordinates[location]:
+            logger.warning(f"Skipping {location}, could not geocode it")
+            continue
+
+        lat, long = coordinates[location]
+        calls = planner.estimate_calls((lat, long))
+
+        if quota_lease and not quota_lease.acquire(calls):
+            logger.warning(f"API quota used up, skipping the remaining locations starting at {location}")
+            break
+
         logger.info(f"Getting data for {location}")
-        google_directions = GoogleGeo(location)
-        loc = LocationStatsGenerator(google_directions.lat, google_directions.long)
-        nearby_places = google_directions.get_nearby_places()
-        commute_times = {
-            "driving_commute_time": google_directions.get_commute_time("driving"),
-            "transit_commute_time": google_directions.get_commute_time("transit"),
-        }
-
-        doc = {
-            "location": location,
-            "latitude": google_directions.lat,
-            "longitude": google_directions.long,
-            "location_stats": loc.location_data,
-            "nearby_places": nearby_places,
-            "commute_times": commute_times,
-            "processed_date": datetime.now(),
-        }
+
+        try:
+            doc = build_profile(location, lat, long, places_index)
+        except ValueError as e:
+            logger.warning(f"Skipping {location}, {e}")
+            continue
+        finally:
+            # The calls made are in the usage ledger now, so the reservation is swapped for the actual usage
+            if quota_lease:
+                quota_lease.release(calls)
 
         data.append(doc)
 
+    places_index.save()
+
     return data
 
 
 @task
-def upload_to_es(es_client: Elasticsearch, data: List[Dict[str, Any]]):
-    """Upload data to Elasticsearch index `location_stats`"""
-    deque(parallel_bulk(es_client, data, index="location_stats"), maxlen=0)
+def upload_to_es(es_client: Elasticsearch, data: List[Dict[str, Any]]) -> int:
+    """Upload data to Elasticsearch index `location_stats`, returning the number of documents indexed"""
+    return sum(success for success, _ in parallel_bulk(es_client, data, index="location_stats"))
+
+
+def get_last_processed_dates(es_client: Elasticsearch, locations: List[str]) -> Dict[str, datetime]:
+    """Gets when each location was last processed from Elasticsearch."""
+
+    results = es_client.search(
+        index=Config.ELASTICSEARCH_INDEX,
+        size=0,
+        query={"terms": {"location.keyword": locations}},
+        aggs={
+            "locations": {
+                "terms": {"field": "location.keyword", "size": len(locations)},
+                "aggs": {"last_processed": {"max": {"field": "processed_date"}}},
+            }
+        },
+    )
+
+    return {
+        bucket["key"]: datetime.fromtimestamp(bucket["last_processed"]["value"] / 1000)
+        for bucket in results["aggregations"]["locations"]["buckets"]
+    }
+
+
+@task
+def plan_locations(locations: List[str], location_values: Dict[str, float] = None) -> List[str]:
+    """
+    Picks the locations this run can afford with the API quota left, stalest and most valuable first.
+
+    Coordinates known from the alias index or the geocode cache are taken into account so locations that don't need
+    geocoding or nearby places calls are estimated as cheaper.
+    """
+
+    logger = prefect.context.get("logger")
+
+    locations = list(dict.fromkeys(locations))
+    es_client = get_elastic_client("https://elastic.sidhulabs.ca:443")
+
+    aliases = LocationAliasIndex(es_client).resolve_many(locations)
+    coordinates = BatchGeocoder().get_cached(locations)
+    coordinates.update({location: (alias["latitude"], alias["longitude"]) for location, alias in aliases.items()})
+
+    planner = QuotaPlanner(places_index=get_nearby_places_index())
+    logger.info(f"Estimated calls: {planner.estimate_total_calls(coordinates)}, budget: {planner.get_budget()}")
+
+    return planner.plan(coordinates, get_last_processed_dates(es_client, locations), location_values)
+
+
+@task
+def shard_locations(locations: List[str], num_shards: int) -> List[List[str]]:
+    """Splits the locations into shards, keeping spellings of the same place in the same shard."""
+
+    return sharding.shard_locations(locations, num_shards)
+
+
+@task
+def process_shard(locations: List[str], export_path: str = None) -> Dict[str, int]:
+    """
+    Gets the data for a shard of locations and uploads it to Elasticsearch, returning the shard's stats.
+
+    Realtor payloads are stored once per unique payload and referenced by hash from the uploaded documents.
+
+    If an export path is passed in, the data is also exported to Parquet files under it.
+    """
+
+    logger = prefect.context.get("logger")
+
+    es_client = get_elastic_client("https://elastic.sidhulabs.ca:443")
+    alias_index = LocationAliasIndex(es_client)
+    alias_index.create_index()
+    payload_store = PayloadStore(es_client)
+    payload_store.create_index()
+
+    data = get_data.run(locations, QuotaLease(), alias_index)
+    indexed = upload_to_es.run(es_client, payload_store.dehydrate(data))
+
+    if export_path:
+        export_location_docs(data, export_path)
+
+    stats = {"shards": 1, "locations": len(locations), "processed": len(data), "indexed": indexed}
+    logger.info(f"Shard stats: {stats}")
+
+    return stats
+
+
+@task
+def merge_shard_stats(shard_stats: List[Dict[str, int]]) -> Dict[str, int]:
+    """Merges the stats of every shard."""
+
+    logger = prefect.context.get("logger")
+
+    stats = sharding.merge_shard_stats(shard_stats)
+    logger.info(f"ETL stats: {stats}")
+
+    return stats
 
 
-with Flow("location-stats-etl", storage=storage, run_config=run_config) as flow:
+with Flow("location-stats-etl", storage=storage, run_config=run_config, executor=executor) as flow:
 
     locations = Parameter("locations", required=True)
+    num_shards = Parameter("num_shards", default=4)
+    export_path = Parameter("export_path", default=None)
+    location_values = Parameter("location_values", default=None)
 
-    es_client = task(get_elastic_client)("https://elastic.sidhulabs.ca:443")
-    conn_success = test_es_client(es_client)
+    conn_success = test_es_client()
 
-    locations_data = get_data(locations)
+    planned_locations = plan_locations(locations, location_values, upstream_tasks=[conn_success])
+    shards = shard_locations(planned_locations, num_shards)
+    shard_stats = process_shard.map(shards, export_path=unmapped(export_path))
 
-    upload_to_es(es_client, locations_data)
+    merge_shard_stats(shard_stats)
 
 # flow.run(parameters=dict(locations=["Riverdale, Ontario"]))
 
@@ -0,0 +1,131 @@
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from loguru import logger
+
+# Seconds to wait on an upstream API before giving up, (connect, read)
+UPSTREAM_TIMEOUT = (3.05, 10)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream API while its circuit breaker is open."""
+
+
+class CircuitBreaker(object):
+    """
+    Stops calling an upstream API after repeated failures so callers fail fast instead of waiting on it.
+
+    After `failure_threshold` consecutive failures the breaker opens and every call raises `CircuitOpenError` for
+    `reset_timeout` seconds. The first call after that is let through as a trial, closing the breaker if it succeeds
+    and opening it for another `reset_timeout` seconds if it fails.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, reset_timeout: float = 60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        """Whether calls are currently being rejected."""
+
+        return self.opened_at is not None and self.seconds_until_retry() > 0
+
+    def seconds_until_retry(self) -> float:
+        """Seconds until the breaker lets a trial call through, 0 if calls are allowed."""
+
+        if self.opened_at is None:
+            return 0
+
+        return max(self.opened_at + self.reset_timeout - time.monotonic(), 0)
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Calls `func` through the breaker.
+
+        Args:
+            func (Callable): Function that calls the upstream API and raises on failure.
+
+        Raises:
+            CircuitOpenError: If the breaker is open.
+
+        Returns:
+            Any: Whatever `func` returns.
+        """
+
+        with self._lock:
+            if self.is_open:
+                raise CircuitOpenError(f"{self.name} is unavailable, retrying in {self.seconds_until_retry():.0f}s")
+
+            if self.opened_at is not None:
+                # Only let one trial call through while half open
+                self.opened_at = time.monotonic()
+
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self._record_failure()
+            raise
+
+        self._record_success()
+
+        return result
+
+    def _record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit breaker for {self.name} closed")
+
+            self.failures = 0
+            self.opened_at = None
+
+    def _record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+            if self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} failures")
+
+                self.opened_at = time.monotonic()
+
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str) -> CircuitBreaker:
+    """
+    Gets the circuit breaker shared by every caller of an upstream API.
+
+    Args:
+        name (str): Upstream API name, i.e "google_maps".
+
+    Returns:
+        CircuitBreaker: Circuit breaker for the API.
+    """
+
+    with _circuit_breakers_lock:
+        if name not in _circuit_breakers:
+            _circuit_breakers[name] = CircuitBreaker(name)
+
+        return _circuit_breakers[name]
+
+
+def upstreams_available(names: List[str]) -> bool:
+    """
+    Whether none of the upstream APIs' circuit breakers are open.
+
+    Args:
+        names (List[str]): Upstream API names.
+
+    Returns:
+        bool: True if calls to every upstream API are allowed.
+    """
+
+    return not any(get_circuit_breaker(name).is_open for name in names)
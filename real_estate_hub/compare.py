@@ -0,0 +1,144 @@
+from typing import Any, Dict, List
+
+import pandas as pd
+import plotly.express as px
+from elasticsearch import Elasticsearch
+from plotly.graph_objects import Figure
+
+from real_estate_hub.config import Config
+from real_estate_hub.data_feeds.location_stats import flatten_location_doc, parse_numeric_values
+from real_estate_hub.location_aliases import LocationAliasIndex
+from real_estate_hub.payload_store import PayloadStore
+from real_estate_hub.profiles import get_location_queries
+
+
+def fetch_profiles(es_client: Elasticsearch, locations: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Fetches the latest profile of every location in one Elasticsearch round trip, plus one to resolve their aliases
+    and one for their Realtor payloads.
+
+    Like a single location lookup, locations are matched by name or, if they resolve to an alias, by the alias'
+    coordinates, so any spelling of a location that was looked up before finds its profile.
+
+    Args:
+        es_client (Elasticsearch): Elasticsearch client.
+        locations (List[str]): Locations to fetch.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Latest profile document of each location that has one.
+    """
+
+    aliases = LocationAliasIndex(es_client).resolve_many(locations)
+
+    searches = []
+    for location in locations:
+        searches.append({"index": Config.ELASTICSEARCH_INDEX})
+        searches.append(
+            {
+                "size": 1,
+                "sort": [{"location_stats.asof_date": {"order": "desc"}}],
+                "query": {
+                    "bool": {"should": get_location_queries(location, aliases.get(location)), "minimum_should_match": 1}
+                },
+            }
+        )
+
+    results = es_client.msearch(searches=searches)
+
+    profiles = {
+        location: response["hits"]["hits"][0]["_source"]
+        for location, response in zip(locations, results["responses"])
+        if response.get("hits", {}).get("hits")
+    }
+
+    return dict(zip(profiles, PayloadStore(es_client).hydrate(list(profiles.values()))))
+
+
+def align_profiles(profiles: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Aligns the stats of many profiles into a single frame.
+
+    Args:
+        profiles (Dict[str, Dict[str, Any]]): Profile documents by location.
+
+    Returns:
+        pd.DataFrame: One row per stat per location, with the location's metadata, `section`, `key`, `value` and
+            `numeric_value`.
+    """
+
+    rows = [
+        {**row, "location": location}
+        for location, profile in profiles.items()
+        for row in flatten_location_doc({**profile, "location": location})
+    ]
+
+    frame = pd.DataFrame(rows, columns=["location", "latitude", "longitude", "asof_date", "section", "key", "value"])
+    frame["numeric_value"] = parse_numeric_values(frame["value"])
+
+    return frame
+
+
+def pivot_section(
+    frame: pd.DataFrame, section: str, values: str = "numeric_value", normalize: bool = False
+) -> pd.DataFrame:
+    """
+    Pivots one section of an aligned frame to one row per stat and one column per location.
+
+    Args:
+        frame (pd.DataFrame): Frame from `align_profiles`.
+        section (str): Section to pivot, i.e "income".
+        values (str, optional): Column to use as values, "value" for the raw strings. Defaults to "numeric_value".
+        normalize (bool, optional): Divide each location's values by their sum, so areas with different populations
+            can be compared. Defaults to False.
+
+    Returns:
+        pd.DataFrame: Stats by location.
+    """
+
+    section_frame = frame[frame["section"] == section]
+
+    # Keep the stats in the order the API returns them, i.e income brackets from lowest to highest
+    keys = section_frame["key"].drop_duplicates()
+    locations = section_frame["location"].drop_duplicates()
+
+    pivoted = section_frame.pivot(index="key", columns="location", values=values).reindex(index=keys, columns=locations)
+
+    if normalize:
+        pivoted = pivoted / pivoted.sum()
+
+    return pivoted
+
+
+def plot_section(frame: pd.DataFrame, section: str, title: str, normalize: bool = True) -> Figure:
+    """
+    Plots one section of an aligned frame as side by side bars for each location.
+
+    Args:
+        frame (pd.DataFrame): Frame from `align_profiles`.
+        section (str): Section to plot, i.e "income".
+        title (str): Title of the chart.
+        normalize (bool, optional): Plot each location's share of the section instead of counts. Defaults to True.
+
+    Returns:
+        Figure: Grouped bar chart.
+    """
+
+    pivoted = pivot_section(frame, section, normalize=normalize)
+    value_label = "Share" if normalize else "Count"
+
+    long_frame = pivoted.reset_index().melt(id_vars="key", var_name="location", value_name=value_label)
+
+    fig = px.bar(
+        long_frame,
+        x="key",
+        y=value_label,
+        color="location",
+        barmode="group",
+        title=title,
+        labels=dict(key="", location="Location"),
+    )
+
+    if normalize:
+        fig.update_yaxes(tickformat=".0%")
+
+    return fig
@@ -7,8 +7,15 @@ class Config(StrEnum):
     """
 
     ELASTICSEARCH_INDEX = "location_stats"
+    ELASTICSEARCH_ALIAS_INDEX = "location_aliases"
+    ELASTICSEARCH_PAYLOAD_INDEX = "realtor_payloads"
 
     RAPID_API_REALTOR_HOST = "realty-in-ca1.p.rapidapi.com"
 
     GOOGLE_MAPS_API_URL = "https://maps.googleapis.com/maps/api"
     GOOGLE_GEO_FILTERING_COMPONENTS = "country:CA|locality:ON"
+
+    GEOCODE_CACHE_PATH = "~/.real_estate_hub/geocodes.json"
+    NEARBY_PLACES_INDEX_PATH = "~/.real_estate_hub/nearby_places.json"
+    QUOTA_LEASE_PATH = "~/.real_estate_hub/quota_lease.json"
+    API_USAGE_LEDGER_PATH = "~/.real_estate_hub/api_usage.jsonl"
@@ -0,0 +1,249 @@
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from real_estate_hub.config import Config
+from real_estate_hub.data_feeds.google_geo import make_google_maps_request
+from real_estate_hub.quota import GEOCODE_CALLS, QuotaLease
+from real_estate_hub.utils import RateLimiter, file_lock, get_fsa, normalize_location, write_json_atomic
+
+# Geocoding API statuses that mean no more requests will succeed for this run
+GOOGLE_GEO_EXHAUSTED_STATUSES = {"OVER_QUERY_LIMIT", "OVER_DAILY_LIMIT", "REQUEST_DENIED"}
+
+
+class GeocodingQuotaExceeded(Exception):
+    """Raised when the Google Geocoding API refuses requests because the quota is used up."""
+
+
+class BatchGeocoder(object):
+    """
+    Geocodes a list of locations with as few Google Geocoding API calls as possible.
+
+    Locations are normalized and deduplicated, previously resolved coordinates are reused from the cache file and the
+    rest are geocoded concurrently under a rate limit. Each call is reserved in the quota lease before it's made, so a
+    batch uses up whatever quota is left. Once the API is exhausted, or the quota lease can't cover another call, the
+    remaining locations fall back to the centroid of their postal code's forward sortation area (FSA) if a
+    centroid table is available.
+    """
+
+    def __init__(
+        self,
+        google_api_key: str = os.environ.get("GOOGLE_API_KEY"),
+        cache_path: str = os.environ.get("GEOCODE_CACHE_PATH", Config.GEOCODE_CACHE_PATH),
+        fsa_centroids_path: str = os.environ.get("FSA_CENTROIDS_PATH"),
+        max_workers: int = 8,
+        calls_per_second: float = 10,
+        quota_lease: QuotaLease = None,
+    ):
+        self.google_api_key = google_api_key
+        self.quota_lease = quota_lease
+        self.cache_path = os.path.expanduser(cache_path) if cache_path else None
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(calls_per_second)
+
+        self.cache = self._load_cache()
+        self.fsa_centroids = self._load_fsa_centroids(fsa_centroids_path) if fsa_centroids_path else {}
+        self.api_exhausted = False
+        self.api_calls = 0
+
+        assert self.google_api_key, "Please set the GOOGLE_API_KEY environment variable or pass in the API key."
+
+    def geocode(self, locations: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Geocodes a list of locations.
+
+        Args:
+            locations (List[str]): Locations to geocode, may contain duplicates.
+
+        Returns:
+            Dict[str, Optional[Dict[str, Any]]]: Geocode of each input location with its `latitude`, `longitude`,
+                the `formatted_address` Google resolved it to, None if it came from the cache or an FSA centroid, and
+                whether it was geocoded `exact`ly or approximated by its FSA centroid. None if the location could not
+                be resolved.
+        """
+
+        normalized = {location: normalize_location(location) for location in locations}
+
+        unresolved = {}
+        for location, key in normalized.items():
+            if key not in self.cache:
+                unresolved.setdefault(key, location)
+
+        logger.info(
+            f"Geocoding {len(locations)} locations: {len(set(normalized.values()))} unique, "
+            f"{len(unresolved)} not in cache"
+        )
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            resolved = dict(zip(unresolved, executor.map(self._resolve, unresolved.values())))
+
+        # Only exact geocodes are cached so FSA centroids get replaced once the API is available again
+        self.cache.update(
+            {
+                key: (geocode["latitude"], geocode["longitude"])
+                for key, geocode in resolved.items()
+                if geocode and geocode["exact"]
+            }
+        )
+        self._save_cache()
+
+        return {
+            location: resolved[key] if key in resolved else self._get_cached_geocode(key)
+            for location, key in normalized.items()
+        }
+
+    def get_cached(self, locations: List[str]) -> Dict[str, Optional[Tuple[float, float]]]:
+        """
+        Gets the coordinates of locations that were geocoded before, without calling the API.
+
+        Args:
+            locations (List[str]): Locations to look up.
+
+        Returns:
+            Dict[str, Optional[Tuple[float, float]]]: Latitude and longitude for each location, None if not cached.
+        """
+
+        return {location: self.cache.get(normalize_location(location)) for location in locations}
+
+    def _resolve(self, location: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolves a single location with the API, falling back to the FSA centroid table once the API or the quota
+        lease is exhausted.
+
+        Args:
+            location (str): Location to resolve.
+
+        Returns:
+            Optional[Dict[str, Any]]: Geocode of the location, see `geocode`, None if it could not be resolved.
+        """
+
+        if not self.api_exhausted and self.quota_lease and not self.quota_lease.acquire(GEOCODE_CALLS):
+            logger.warning("No quota left for Google Geocoding API calls, falling back to FSA centroids")
+            self.api_exhausted = True
+
+        if not self.api_exhausted:
+            try:
+                return self._geocode(location)
+            except GeocodingQuotaExceeded as e:
+                logger.warning(f"Google Geocoding API exhausted, falling back to FSA centroids: {e}")
+                self.api_exhausted = True
+            except Exception as e:
+                logger.error(f"Error geocoding {location}: {e}")
+                return None
+            finally:
+                # The call made is in the usage ledger now
+                if self.quota_lease:
+                    self.quota_lease.release(GEOCODE_CALLS)
+
+        centroid = self._get_fsa_centroid(location)
+
+        if not centroid:
+            return None
+
+        return {"latitude": centroid[0], "longitude": centroid[1], "formatted_address": None, "exact": False}
+
+    def _geocode(self, location: str) -> Optional[Dict[str, Any]]:
+        """
+        Geocodes a location with the Google Geocoding API.
+
+        Args:
+            location (str): Location to geocode.
+
+        Raises:
+            GeocodingQuotaExceeded: If the API refuses the request because the quota is used up.
+
+        Returns:
+            Optional[Dict[str, Any]]: Exact geocode of the location, see `geocode`, None if not found.
+        """
+
+        self.rate_limiter.wait()
+
+        params = {"address": location, "components": Config.GOOGLE_GEO_FILTERING_COMPONENTS}
+        data = make_google_maps_request("geocode", params, self.google_api_key)
+        self.api_calls += 1
+
+        if data["status"] in GOOGLE_GEO_EXHAUSTED_STATUSES:
+            raise GeocodingQuotaExceeded(data.get("error_message", data["status"]))
+
+        if not data["results"]:
+            logger.warning(f"Could not find {location} on Google Maps.")
+            return None
+
+        location_dict = data["results"][0]["geometry"]["location"]
+
+        return {
+            "latitude": location_dict["lat"],
+            "longitude": location_dict["lng"],
+            "formatted_address": data["results"][0].get("formatted_address"),
+            "exact": True,
+        }
+
+    def _get_cached_geocode(self, key: str) -> Optional[Dict[str, Any]]:
+        """Gets the geocode of a normalized location from the cache, which only holds exact geocodes."""
+
+        if key not in self.cache:
+            return None
+
+        lat, long = self.cache[key]
+
+        return {"latitude": lat, "longitude": long, "formatted_address": None, "exact": True}
+
+    def _get_fsa_centroid(self, location: str) -> Optional[Tuple[float, float]]:
+        """
+        Gets the centroid of the forward sortation area of the location's postal code.
+
+        Args:
+            location (str): Location to get the centroid for.
+
+        Returns:
+            Optional[Tuple[float, float]]: Latitude and longitude of the FSA centroid, None if not available.
+        """
+
+        fsa = get_fsa(location)
+        centroid = self.fsa_centroids.get(fsa)
+
+        if not centroid:
+            logger.warning(f"No FSA centroid available for {location}")
+
+        return centroid
+
+    def _load_cache(self) -> Dict[str, Tuple[float, float]]:
+        """Loads previously resolved coordinates from the cache file."""
+
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+
+        with open(self.cache_path) as f:
+            return {key: tuple(lat_long) for key, lat_long in json.load(f).items()}
+
+    def _save_cache(self):
+        """Saves resolved coordinates to the cache file, merging in anything other processes saved meanwhile."""
+
+        if not self.cache_path:
+            return
+
+        with file_lock(self.cache_path):
+            self.cache = {**self._load_cache(), **self.cache}
+            write_json_atomic(self.cache_path, self.cache)
+
+    @staticmethod
+    def _load_fsa_centroids(path: str) -> Dict[str, Tuple[float, float]]:
+        """
+        Loads FSA centroids from a CSV file with `fsa`, `latitude` and `longitude` columns.
+
+        Args:
+            path (str): Path to the CSV file.
+
+        Returns:
+            Dict[str, Tuple[float, float]]: Latitude and longitude for each FSA.
+        """
+
+        with open(path, newline="") as f:
+            return {
+                row["fsa"].strip().upper(): (float(row["latitude"]), float(row["longitude"]))
+                for row in csv.DictReader(f)
+            }
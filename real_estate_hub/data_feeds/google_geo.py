@@ -1,97 +1,171 @@
 import os
 import time
-from typing import Any, Dict, List, Tuple
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 from loguru import logger
 
+from real_estate_hub.circuit_breaker import UPSTREAM_TIMEOUT, get_circuit_breaker
 from real_estate_hub.config import Config
+from real_estate_hub.data_feeds.nearby_places_index import NEARBY_PLACES_RADIUS_METRES, NearbyPlacesIndex
+from real_estate_hub.quota import record_api_call
+from real_estate_hub.utils import haversine_distance
+
+GOOGLE_GEO_SUPPORTED_NEARBY_PLACE_TYPES = frozenset(
+    {
+        "airport",
+        "amusement_park",
+        "aquarium",
+        "art_gallery",
+        "bakery",
+        "bank",
+        "bar",
+        "beatuy_salon",
+        "book_store",
+        "bowling_alley",
+        "bus_station",
+        "cafe",
+        "campground",
+        "car_repair",
+        "casino",
+        "cemetery",
+        "church",
+        "city_hall",
+        "clothing_store",
+        "convenience_store",
+        "courthouse",
+        "dentist",
+        "department_store",
+        "doctor",
+        "drugstore",
+        "electrician",
+        "electronics_store",
+        "fire_station",
+        "funeral_home",
+        "gas_station",
+        "gym",
+        "hair_care",
+        "hardware_store",
+        "health",
+        "hindu_temple",
+        "home_goods_store",
+        "hospital",
+        "laundry",
+        "library",
+        "liquor_store",
+        "local_government_office",
+        "locksmith",
+        "mosque",
+        "movie_theater",
+        "museum",
+        "night_club",
+        "park",
+        "pet_store",
+        "pharmacy",
+        "physiotherapist",
+        "plumber",
+        "police",
+        "post_office",
+        "primary_school",
+        "restaurant",
+        "school",
+        "secondary_school",
+        "shopping_mall",
+        "spa",
+        "stadium",
+        "storage",
+        "store",
+        "subway_station",
+        "supermarket",
+        "synagogue",
+        "tourist_attraction",
+        "train_station",
+        "transit_station",
+        "university",
+        "veterinary_care",
+        "zoo",
+    }
+)
+
+
+@lru_cache(maxsize=None)
+def classify_place_types(place_types: Tuple[str, ...]) -> Optional[str]:
+    """
+    Gets the first supported nearby place type out of a place's types.
+
+    Places share a small number of type combinations, so results are cached by the full tuple of types.
+
+    Args:
+        place_types (Tuple[str, ...]): Types of a place from the Google Places API.
+
+    Returns:
+        Optional[str]: First supported type, None if the place has no supported type.
+    """
+
+    return next(
+        (place_type for place_type in place_types if place_type in GOOGLE_GEO_SUPPORTED_NEARBY_PLACE_TYPES), None
+    )
+
+
+def make_google_maps_request(endpoint: str, params: Dict[str, Any], google_api_key: str) -> Dict[str, Any]:
+    """
+    Makes a request to the Google Maps API.
+
+    The API key is automatically added to the request parameters if not present. Requests time out after
+    `UPSTREAM_TIMEOUT` and go through the Google Maps circuit breaker.
+
+    Args:
+        endpoint (str): Google Maps API endpoint to make the request to.
+        params (Dict[str, Any]): Params for the API request.
+        google_api_key (str): Google API key.
+
+    Raises:
+        CircuitOpenError: If Google Maps has been failing and the circuit breaker is open.
+
+    Returns:
+        Dict[str, Any]: JSON response from the API.
+    """
+
+    if "key" not in params:
+        params["key"] = google_api_key
+
+    def request() -> Dict[str, Any]:
+        record_api_call("google_maps", endpoint)
+        req = requests.get(
+            url=f"{os.environ.get('GOOGLE_MAPS_API_URL', Config.GOOGLE_MAPS_API_URL)}/{endpoint}/json",
+            params=params,
+            timeout=UPSTREAM_TIMEOUT,
+        )
+
+        req.raise_for_status()
+
+        return req.json()
+
+    return get_circuit_breaker("google_maps").call(request)
 
 
 class GoogleGeo(object):
     def __init__(
-        self, location, lat: float = None, long: float = None, google_api_key: str = os.environ.get("GOOGLE_API_KEY")
+        self,
+        location,
+        lat: float = None,
+        long: float = None,
+        google_api_key: str = os.environ.get("GOOGLE_API_KEY"),
+        places_index: NearbyPlacesIndex = None,
     ):
         self.location = location
         self.google_api_key = google_api_key
-        self.google_api_url = Config.GOOGLE_MAPS_API_URL
-
-        self.google_geo_supported_nearby_place_types = {
-            "airport",
-            "amusement_park",
-            "aquarium",
-            "art_gallery",
-            "bakery",
-            "bank",
-            "bar",
-            "beatuy_salon",
-            "book_store",
-            "bowling_alley",
-            "bus_station",
-            "cafe",
-            "campground",
-            "car_repair",
-            "casino",
-            "cemetery",
-            "church",
-            "city_hall",
-            "clothing_store",
-            "convenience_store",
-            "courthouse",
-            "dentist",
-            "department_store",
-            "doctor",
-            "drugstore",
-            "electrician",
-            "electronics_store",
-            "fire_station",
-            "funeral_home",
-            "gas_station",
-            "gym",
-            "hair_care",
-            "hardware_store",
-            "health",
-            "hindu_temple",
-            "home_goods_store",
-            "hospital",
-            "laundry",
-            "library",
-            "liquor_store",
-            "local_government_office",
-            "locksmith",
-            "mosque",
-            "movie_theater",
-            "museum",
-            "night_club",
-            "park",
-            "pet_store",
-            "pharmacy",
-            "physiotherapist",
-            "plumber",
-            "police",
-            "post_office",
-            "primary_school",
-            "restaurant",
-            "school",
-            "secondary_school",
-            "shopping_mall",
-            "spa",
-            "stadium",
-            "storage",
-            "store",
-            "subway_station",
-            "supermarket",
-            "synagogue",
-            "tourist_attraction",
-            "train_station",
-            "transit_station",
-            "university",
-            "veterinary_care",
-            "zoo",
-        }
+        self.places_index = places_index
+        self.google_api_url = os.environ.get("GOOGLE_MAPS_API_URL", Config.GOOGLE_MAPS_API_URL)
+
+        self.google_geo_supported_nearby_place_types = GOOGLE_GEO_SUPPORTED_NEARBY_PLACE_TYPES
 
         assert self.google_api_key, "Please set the GOOGLE_API_KEY environment variable or pass in the API key."
 
+        # Address Google resolved the location to, only set when the location is geocoded
+        self.formatted_address = None
+
         if lat and long:
             self.lat = lat
             self.long = long
@@ -113,20 +187,15 @@ class GoogleGeo(object):
             Dict[str, Any]: JSON response from the API.
         """
 
-        if "key" not in params:
-            params["key"] = self.google_api_key
-
-        req = requests.get(url=f"{self.google_api_url}/{endpoint}/json", params=params)
-
-        req.raise_for_status()
-
-        return req.json()
+        return make_google_maps_request(endpoint, params, self.google_api_key)
 
     @logger.catch
     def get_lat_long(self) -> Tuple[float, float]:
         """
         Gets the latitude and longitude of the location.
 
+        Also stores the address Google resolved the location to in `formatted_address`.
+
         Returns:
             Tuple[float, float]: Latitude and longitude of the location.
         """
@@ -135,6 +204,8 @@ class GoogleGeo(object):
 
         data = self.make_request("geocode", params)
 
+        self.formatted_address = data["results"][0].get("formatted_address")
+
         location_dict = data["results"][0]["geometry"]["location"]
         lattitude = location_dict["lat"]
         longitude = location_dict["lng"]
@@ -168,12 +239,26 @@ class GoogleGeo(object):
     @logger.catch
     def get_nearby_places(self) -> Dict[str, Any]:
         """
-        Gets nearby places for a location within a radius.
+        Gets nearby places within NEARBY_PLACES_RADIUS_METRES of a location, closest first.
+
+        If a places index was passed in and already covers the area around the location, the places are served from
+        the index without calling the Places API. Otherwise every API result is added to the index, and only the ones
+        within the radius are returned, so both paths return the same places.
 
         Returns:
             Dict[str, Any]: Filtered locations
         """
 
+        if self.places_index is not None and self.places_index.is_covered(
+            self.lat, self.long, NEARBY_PLACES_RADIUS_METRES
+        ):
+            logger.info(f"Using nearby places from the places index for {self.location}")
+
+            return [
+                {"Type": place["type"].replace("_", " ").title(), "Name": place["name"]}
+                for place in self.places_index.query(self.lat, self.long, NEARBY_PLACES_RADIUS_METRES)
+            ]
+
         params = {
             "location": f"{self.lat},{self.long}",
             "rankby": "distance",
@@ -185,21 +270,33 @@ class GoogleGeo(object):
         if not all_results:
             return None
 
-        filtered_nearby_places = []
-
-        for result in all_results:
-            for data in result["results"]:
-                for place_type in data["types"]:
-                    if place_type in self.google_geo_supported_nearby_place_types:
-                        place = {
-                            "Type": place_type.replace("_", " ").title(),
-                            "Name": data["name"],
-                            # 'icon': data["icon"],
-                            # 'Address': data["vicinity"],
-                            # 'Rating': str(data.get("rating", "NA")),
-                        }
-                        filtered_nearby_places.append(place)
-                        break
+        places = [
+            {
+                "place_id": data["place_id"],
+                "name": data["name"],
+                "lat": data["geometry"]["location"]["lat"],
+                "long": data["geometry"]["location"]["lng"],
+                "type": classify_place_types(tuple(data["types"])),
+            }
+            for result in all_results
+            for data in result["results"]
+        ]
+
+        if self.places_index is not None:
+            self.places_index.add_places(self.lat, self.long, places)
+
+        filtered_nearby_places = [
+            {
+                "Type": place["type"].replace("_", " ").title(),
+                "Name": place["name"],
+                # 'icon': data["icon"],
+                # 'Address': data["vicinity"],
+                # 'Rating': str(data.get("rating", "NA")),
+            }
+            for place in places
+            if place["type"]
+            and haversine_distance(self.lat, self.long, place["lat"], place["long"]) <= NEARBY_PLACES_RADIUS_METRES
+        ]
 
         return filtered_nearby_places
 
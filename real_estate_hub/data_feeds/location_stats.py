@@ -1,12 +1,78 @@
 import os
 from datetime import datetime
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import pandas as pd
 import requests
 from loguru import logger
 
+from real_estate_hub.circuit_breaker import UPSTREAM_TIMEOUT, get_circuit_breaker
 from real_estate_hub.config import Config
+from real_estate_hub.quota import record_api_call
+
+# Index of each section in the `Data` field of the Realtor API statistics response
+LOCATION_STATS_SECTIONS = {
+    "general_stats": 0,
+    "age_distribution": 2,
+    "population_forecast": 3,
+    "education": 4,
+    "marital_status": 5,
+    "language": 6,
+    "income": 7,
+    "children_at_home": 8,
+    "rent_or_owned": 9,
+    "age_of_home_distribution": 10,
+    "occupations": 11,
+}
+
+SECTION_NAMES = {index: section for section, index in LOCATION_STATS_SECTIONS.items()}
+
+
+def flatten_location_doc(doc: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Flattens a location stats document into one row per stat.
+
+    Args:
+        doc (Dict[str, Any]): Document from the `location_stats` index or the ETL.
+
+    Returns:
+        List[Dict[str, Any]]: Rows with the location's metadata, the section, the stat and its value.
+    """
+
+    location_data = doc.get("location_stats") or {}
+
+    metadata = {
+        "location": doc["location"],
+        "latitude": doc["latitude"],
+        "longitude": doc["longitude"],
+        "asof_date": location_data.get("asof_date"),
+        "processed_date": doc.get("processed_date"),
+    }
+
+    return [
+        {
+            **metadata,
+            "section": SECTION_NAMES.get(index, f"section_{index}"),
+            "key": stat["key"],
+            "value": stat["value"],
+        }
+        for index, section in enumerate(location_data.get("Data", []))
+        for stat in section["value"]
+    ]
+
+
+def parse_numeric_values(values: pd.Series) -> pd.Series:
+    """
+    Parses stat values into numbers, i.e "$80,000.00" to 80000.0 and "12%" to 12.0.
+
+    Args:
+        values (pd.Series): Stat values as returned by the Realtor API.
+
+    Returns:
+        pd.Series: Numeric values, NaN where a value isn't a number.
+    """
+
+    return pd.to_numeric(values.astype("string").str.replace(r"[$,%]", "", regex=True), errors="coerce")
 
 
 class LocationStatsGenerator(object):
@@ -22,13 +88,18 @@ class LocationStatsGenerator(object):
         self.long = longitude
         self.rapid_api_key = rapid_api_key
         self.rapid_api_realtor_host = Config.RAPID_API_REALTOR_HOST
-        self.rapid_api_realtor_url = f"https://{self.rapid_api_realtor_host}/properties/get-statistics"
+        self.rapid_api_realtor_url = os.environ.get(
+            "RAPID_API_REALTOR_URL", f"https://{self.rapid_api_realtor_host}/properties/get-statistics"
+        )
 
         assert self.rapid_api_key, "Please set the RAPID_API_KEY environment variable or pass in the API key."
 
         if not location_data:
             self.location_data = self._get_location_data()
 
+            if not self.location_data:
+                raise ValueError(f"Could not get location stats for {self.lat}, {self.long} from the Realtor API.")
+
             self.location_data["asof_date"] = datetime.strptime(
                 self.location_data["ErrorCode"]["ProductName"].split("|")[-1].strip(),
                 "%A, %B %d, %Y %I:%M:%S %p",
@@ -39,42 +110,44 @@ class LocationStatsGenerator(object):
         self.as_of_date = self.location_data["asof_date"]
 
     def get_general_stats(self) -> pd.DataFrame:
-        return pd.DataFrame(self._get_nested_data(0))
+        return pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["general_stats"]))
 
     def get_age_distribution(self) -> pd.DataFrame:
-        return pd.DataFrame(self._get_nested_data(2)).astype(dtype={"value": "int"})
+        return pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["age_distribution"])).astype(
+            dtype={"value": "int"}
+        )
 
     def get_population_forecast(self) -> pd.DataFrame:
-        return pd.DataFrame(self._get_nested_data(3))
+        return pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["population_forecast"]))
 
     def get_education(self) -> pd.DataFrame:
-        return pd.DataFrame(self._get_nested_data(4))
+        return pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["education"]))
 
     def get_marital_status(self) -> pd.DataFrame:
-        return pd.DataFrame(self._get_nested_data(5))
+        return pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["marital_status"]))
 
     def get_language(self) -> pd.DataFrame:
         return (
-            pd.DataFrame(self._get_nested_data(6))
+            pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["language"]))
             .astype(dtype={"value": "int"})
             .sort_values(by=["value"], ascending=False)
         )
 
     def get_income(self) -> pd.DataFrame:
-        return pd.DataFrame(self._get_nested_data(7)).astype(dtype={"value": "int"})
+        return pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["income"])).astype(dtype={"value": "int"})
 
     def get_children_at_home(self) -> pd.DataFrame:
-        return pd.DataFrame(self._get_nested_data(8))
+        return pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["children_at_home"]))
 
     def get_rent_or_owned(self) -> pd.DataFrame:
-        return pd.DataFrame(self._get_nested_data(9))
+        return pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["rent_or_owned"]))
 
     def get_age_of_home_distribution(self) -> pd.DataFrame:
-        return pd.DataFrame(self._get_nested_data(10))
+        return pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["age_of_home_distribution"]))
 
     def get_occupations(self) -> pd.DataFrame:
         return (
-            pd.DataFrame(self._get_nested_data(11))
+            pd.DataFrame(self._get_nested_data(LOCATION_STATS_SECTIONS["occupations"]))
             .astype(dtype={"value": "int"})
             .sort_values(by=["value"], ascending=False)
         )
@@ -122,8 +195,15 @@ class LocationStatsGenerator(object):
         headers = {"x-rapidapi-host": self.rapid_api_realtor_host, "x-rapidapi-key": self.rapid_api_key}
 
         # response
-        response = requests.request("GET", self.rapid_api_realtor_url, headers=headers, params=querystring)
-        return response.json()  # json format
+        def request() -> Dict[str, Any]:
+            record_api_call("realtor", "properties/get-statistics")
+            response = requests.request(
+                "GET", self.rapid_api_realtor_url, headers=headers, params=querystring, timeout=UPSTREAM_TIMEOUT
+            )
+            response.raise_for_status()
+            return response.json()  # json format
+
+        return get_circuit_breaker("realtor").call(request)
 
     def _get_nested_data(self, index: int) -> Dict[str, Any]:
         """
@@ -0,0 +1,363 @@
+import json
+import math
+import os
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from real_estate_hub.config import Config
+from real_estate_hub.utils import file_lock, haversine_distance, write_json_atomic
+
+METRES_PER_DEGREE_LATITUDE = 111_320
+
+# Radius nearby places are served from the index for, about the distance covered by one page of nearby search results
+NEARBY_PLACES_RADIUS_METRES = 500
+
+
+class NearbyPlacesIndex(object):
+    """
+    Local spatial index of every place returned by the Google Places API.
+
+    Places are deduplicated by place id and by name + location, and bucketed into a grid of `cell_size` degree cells so
+    radius queries only look at nearby cells. Every nearby search that populated the index is recorded as a covered
+    circle, since a search ranked by distance returns every place closer than the farthest result. A location whose
+    query circle falls inside a covered circle can be answered from the index without calling the Places API. Covered
+    circles are bucketed into every grid cell they overlap, so coverage checks only look at the location's cell.
+
+    The index is stored as a JSON snapshot plus a journal of the places and coverage added since. `append` only writes
+    what's new to the journal, so the app can persist each lookup cheaply, and `save` folds the journal back into the
+    snapshot.
+    """
+
+    def __init__(self, path: str = None, cell_size: float = 0.01):
+        self.path = os.path.expanduser(path) if path else None
+        self.cell_size = cell_size
+
+        self.places: Dict[str, Dict[str, Any]] = {}
+        self.coverage: List[Tuple[float, float, float]] = []
+        self._name_location_ids: Dict[Tuple[str, float, float], str] = {}
+        self._grid: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+        self._coverage_grid: Dict[Tuple[int, int], List[Tuple[float, float, float]]] = defaultdict(list)
+
+        # Places and coverage added since the index was last saved or appended to its journal
+        self._pending_places: List[Dict[str, Any]] = []
+        self._pending_coverage: List[Tuple[float, float, float]] = []
+        self._pending_lock = threading.Lock()
+
+        if self.path and (os.path.exists(self.path) or os.path.exists(get_journal_path(self.path))):
+            self.load()
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def add_places(self, lat: float, long: float, places: List[Dict[str, Any]]) -> int:
+        """
+        Adds the places returned by a nearby search around a location.
+
+        Args:
+            lat (float): Latitude the nearby search was made from.
+            long (float): Longitude the nearby search was made from.
+            places (List[Dict[str, Any]]): Places with `place_id`, `name`, `lat`, `long` and `type` keys, where `type`
+                is the supported place type or None.
+
+        Returns:
+            int: Number of new places added to the index.
+        """
+
+        added = []
+        farthest = 0.0
+
+        for place in places:
+            farthest = max(farthest, float(haversine_distance(lat, long, place["lat"], place["long"])))
+
+            if self._add_place(place):
+                added.append(place)
+
+        self._add_coverage((lat, long, farthest))
+
+        with self._pending_lock:
+            self._pending_places.extend(added)
+            self._pending_coverage.append((lat, long, farthest))
+
+        return len(added)
+
+    def is_covered(self, lat: float, long: float, radius: float) -> bool:
+        """
+        Whether every place within `radius` metres of a location is already in the index.
+
+        Args:
+            lat (float): Latitude of the location.
+            long (float): Longitude of the location.
+            radius (float): Radius in metres.
+
+        Returns:
+            bool: True if a previous nearby search covered the whole circle.
+        """
+
+        # A circle covering the query circle contains its centre, so it is bucketed in the centre's cell
+        return any(
+            haversine_distance(lat, long, covered_lat, covered_long) + radius <= covered_radius
+            for covered_lat, covered_long, covered_radius in self._coverage_grid.get(self._get_cell(lat, long), [])
+        )
+
+    def query(self, lat: float, long: float, radius: float, place_type: str = None) -> List[Dict[str, Any]]:
+        """
+        Gets places within `radius` metres of a location, closest first.
+
+        Args:
+            lat (float): Latitude of the location.
+            long (float): Longitude of the location.
+            radius (float): Radius in metres.
+            place_type (str, optional): Only return places of this type, i.e "park". Defaults to any supported type.
+
+        Returns:
+            List[Dict[str, Any]]: Matching places.
+        """
+
+        candidates = [self.places[place_id] for place_id in self._get_candidate_ids(lat, long, radius)]
+        candidates = [
+            place for place in candidates if place["type"] and (place_type is None or place["type"] == place_type)
+        ]
+
+        if not candidates:
+            return []
+
+        distances = haversine_distance(
+            lat,
+            long,
+            np.array([place["lat"] for place in candidates]),
+            np.array([place["long"] for place in candidates]),
+        )
+
+        return [candidates[i] for i in np.argsort(distances, kind="stable") if distances[i] <= radius]
+
+    def count_amenities(self, locations: Dict[str, Tuple[float, float]], radius: float) -> pd.DataFrame:
+        """
+        Counts places of each type within `radius` metres of every location in one vectorized pass.
+
+        Args:
+            locations (Dict[str, Tuple[float, float]]): Latitude and longitude of each location, i.e neighbourhoods.
+            radius (float): Radius in metres.
+
+        Returns:
+            pd.DataFrame: Number of places per type (columns) for each location (rows).
+        """
+
+        typed_places = pd.DataFrame([place for place in self.places.values() if place["type"]])
+
+        if typed_places.empty or not locations:
+            return pd.DataFrame(index=list(locations))
+
+        location_coords = np.array(list(locations.values()), dtype=float)
+
+        # (locations x places) distance matrix, multiplied by a one hot (places x types) matrix gives the counts
+        distances = haversine_distance(
+            location_coords[:, [0]],
+            location_coords[:, [1]],
+            typed_places["lat"].to_numpy()[np.newaxis, :],
+            typed_places["long"].to_numpy()[np.newaxis, :],
+        )
+        one_hot_types = pd.get_dummies(typed_places["type"])
+
+        counts = (distances <= radius).astype(int) @ one_hot_types.to_numpy(dtype=int)
+
+        return pd.DataFrame(counts, index=list(locations), columns=one_hot_types.columns)
+
+    def save(self, path: str = None):
+        """
+        Saves the whole index to a JSON file and clears its journal.
+
+        Places other processes saved or appended to the file since it was loaded are merged in first, so ETL shards
+        sharing the file don't overwrite each other. This rewrites the whole file, use `append` on request paths.
+
+        Args:
+            path (str, optional): Path to save to. Defaults to the path the index was created with.
+        """
+
+        path = os.path.expanduser(path) if path else self.path
+        journal_path = get_journal_path(path)
+
+        with file_lock(path):
+            if os.path.exists(path) or os.path.exists(journal_path):
+                self.load(path)
+
+            write_json_atomic(path, {"places": list(self.places.values()), "coverage": self.coverage})
+
+            if os.path.exists(journal_path):
+                os.remove(journal_path)
+
+            with self._pending_lock:
+                self._pending_places, self._pending_coverage = [], []
+
+        logger.info(f"Saved {len(self)} places to {path}")
+
+    def append(self, path: str = None) -> int:
+        """
+        Appends the places and coverage added since the index was last saved or appended to the journal of a JSON file.
+
+        Only the new places are written, so this stays cheap however big the index gets.
+
+        Args:
+            path (str, optional): Path of the JSON file to append to the journal of. Defaults to the path the index
+                was created with.
+
+        Returns:
+            int: Number of places appended.
+        """
+
+        path = os.path.expanduser(path) if path else self.path
+
+        with self._pending_lock:
+            places, coverage = self._pending_places, self._pending_coverage
+            self._pending_places, self._pending_coverage = [], []
+
+        if not places and not coverage:
+            return 0
+
+        # Locked so the entry doesn't land in a journal `save` is folding into the snapshot and clearing
+        with file_lock(path):
+            with open(get_journal_path(path), "a") as f:
+                f.write(json.dumps({"places": places, "coverage": coverage}) + "\n")
+
+        return len(places)
+
+    def load(self, path: str = None):
+        """
+        Loads places and coverage from a JSON file and its journal into the index.
+
+        Args:
+            path (str, optional): Path to load from. Defaults to the path the index was created with.
+        """
+
+        path = os.path.expanduser(path) if path else self.path
+        entries = []
+
+        if os.path.exists(path):
+            with open(path) as f:
+                entries.append(json.load(f))
+
+        if os.path.exists(journal_path := get_journal_path(path)):
+            with open(journal_path) as f:
+                entries.extend(json.loads(line) for line in f if line.strip())
+
+        covered = set(self.coverage)
+
+        for data in entries:
+            for place in data["places"]:
+                self._add_place(place)
+
+            for circle in map(tuple, data["coverage"]):
+                if circle not in covered:
+                    self._add_coverage(circle)
+                    covered.add(circle)
+
+    def _add_place(self, place: Dict[str, Any]) -> bool:
+        """
+        Adds a single place to the index unless it is a duplicate.
+
+        Args:
+            place (Dict[str, Any]): Place to add.
+
+        Returns:
+            bool: True if the place was added.
+        """
+
+        name_location = (place["name"].lower(), round(place["lat"], 4), round(place["long"], 4))
+
+        if place["place_id"] in self.places or name_location in self._name_location_ids:
+            return False
+
+        self.places[place["place_id"]] = place
+        self._name_location_ids[name_location] = place["place_id"]
+        self._grid[self._get_cell(place["lat"], place["long"])].append(place["place_id"])
+
+        return True
+
+    def _add_coverage(self, circle: Tuple[float, float, float]):
+        """
+        Records a covered circle and buckets it into every grid cell it overlaps.
+
+        Args:
+            circle (Tuple[float, float, float]): Latitude, longitude and radius in metres of the circle.
+        """
+
+        self.coverage.append(circle)
+
+        for cell in self._get_cells(*circle):
+            self._coverage_grid[cell].append(circle)
+
+    def _get_cell(self, lat: float, long: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(long / self.cell_size)
+
+    def _get_cells(self, lat: float, long: float, radius: float) -> List[Tuple[int, int]]:
+        """
+        Gets every grid cell that overlaps the bounding box of a circle.
+
+        Args:
+            lat (float): Latitude of the circle's centre.
+            long (float): Longitude of the circle's centre.
+            radius (float): Radius of the circle in metres.
+
+        Returns:
+            List[Tuple[int, int]]: Grid cells.
+        """
+
+        lat_delta = radius / METRES_PER_DEGREE_LATITUDE
+        long_delta = radius / (METRES_PER_DEGREE_LATITUDE * max(math.cos(math.radians(lat)), 1e-6))
+
+        min_lat_cell, min_long_cell = self._get_cell(lat - lat_delta, long - long_delta)
+        max_lat_cell, max_long_cell = self._get_cell(lat + lat_delta, long + long_delta)
+
+        return [
+            (lat_cell, long_cell)
+            for lat_cell in range(min_lat_cell, max_lat_cell + 1)
+            for long_cell in range(min_long_cell, max_long_cell + 1)
+        ]
+
+    def _get_candidate_ids(self, lat: float, long: float, radius: float) -> List[str]:
+        """
+        Gets the ids of places in every grid cell that overlaps the bounding box of a circle.
+
+        Args:
+            lat (float): Latitude of the circle's centre.
+            long (float): Longitude of the circle's centre.
+            radius (float): Radius of the circle in metres.
+
+        Returns:
+            List[str]: Place ids.
+        """
+
+        return [place_id for cell in self._get_cells(lat, long, radius) for place_id in self._grid.get(cell, [])]
+
+
+def get_journal_path(path: str) -> str:
+    """
+    Gets the journal file of a nearby places index file, i.e `nearby_places.journal.jsonl` for `nearby_places.json`.
+
+    Args:
+        path (str): Path of the index file.
+
+    Returns:
+        str: Path of the journal file.
+    """
+
+    return f"{os.path.splitext(path)[0]}.journal.jsonl"
+
+
+def get_nearby_places_index(path: Optional[str] = None) -> NearbyPlacesIndex:
+    """
+    Gets the nearby places index stored at `path`, the NEARBY_PLACES_INDEX_PATH environment variable or the default
+    path.
+
+    Args:
+        path (str, optional): Path of the index file.
+
+    Returns:
+        NearbyPlacesIndex: Nearby places index.
+    """
+
+    return NearbyPlacesIndex(path or os.environ.get("NEARBY_PLACES_INDEX_PATH", Config.NEARBY_PLACES_INDEX_PATH))
@@ -1,15 +1,19 @@
 from __future__ import annotations
 
+import os
 import string
 
 import pandas as pd
 import requests
 from loguru import logger
 
+from real_estate_hub.circuit_breaker import UPSTREAM_TIMEOUT, get_circuit_breaker
+from real_estate_hub.quota import record_api_call
+
 
 class ZoloScraper(object):
     def __init__(self, address: str):
-        self.url = "https://www.zolo.ca/toronto-real-estate"
+        self.url = os.environ.get("ZOLO_URL", "https://www.zolo.ca/toronto-real-estate")
         self.address = address
 
         self.search_address = (
@@ -32,7 +36,13 @@ class ZoloScraper(object):
             "BID": "c0554356-52b8-11ec-8aa0-bc764e102e1e",
         }
 
-        req = requests.get(f"{self.url}/{self.search_address}", headers=headers, cookies=cookies)
+        def request() -> requests.Response:
+            record_api_call("zolo", "toronto-real-estate")
+            return requests.get(
+                f"{self.url}/{self.search_address}", headers=headers, cookies=cookies, timeout=UPSTREAM_TIMEOUT
+            )
+
+        req = get_circuit_breaker("zolo").call(request)
 
         self.html = req.text
 
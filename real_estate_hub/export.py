@@ -0,0 +1,156 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from elasticsearch import Elasticsearch
+from elasticsearch.helpers import scan
+from loguru import logger
+from pyarrow.fs import LocalFileSystem
+
+from real_estate_hub.config import Config
+from real_estate_hub.data_feeds.location_stats import flatten_location_doc, parse_numeric_values
+from real_estate_hub.payload_store import PayloadStore
+
+LOCATION_STATS_SCHEMA = pa.schema(
+    [
+        ("location", pa.string()),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("asof_date", pa.date32()),
+        ("processed_date", pa.timestamp("us")),
+        ("section", pa.string()),
+        ("key", pa.string()),
+        ("value", pa.string()),
+        ("numeric_value", pa.float64()),
+    ]
+)
+
+# Arrow IPC files can be memory mapped as is, Parquet is smaller on disk
+EXPORT_FORMATS = {"parquet", "ipc"}
+
+
+def to_record_batch(rows: List[Dict[str, Any]]) -> pa.RecordBatch:
+    """
+    Converts flattened rows to a record batch, parsing the stat values into numbers where possible.
+
+    Args:
+        rows (List[Dict[str, Any]]): Rows from `flatten_location_doc`.
+
+    Returns:
+        pa.RecordBatch: Record batch with the `LOCATION_STATS_SCHEMA` schema.
+    """
+
+    df = pd.DataFrame(rows, columns=LOCATION_STATS_SCHEMA.names[:-1])
+
+    df["asof_date"] = pd.to_datetime(df["asof_date"]).dt.date
+    df["processed_date"] = pd.to_datetime(df["processed_date"])
+    df["value"] = df["value"].astype("string")
+    df["numeric_value"] = parse_numeric_values(df["value"])
+
+    return pa.RecordBatch.from_pandas(df, schema=LOCATION_STATS_SCHEMA, preserve_index=False)
+
+
+def export_location_docs(
+    docs: Iterable[Dict[str, Any]], path: str, export_format: str = "parquet", batch_size: int = 50_000
+) -> int:
+    """
+    Streams location stats documents into files partitioned by section under `path`.
+
+    Every export adds new files, so exporting each ETL run builds up the full history of snapshots.
+
+    Args:
+        docs (Iterable[Dict[str, Any]]): Location stats documents.
+        path (str): Directory to export to.
+        export_format (str, optional): "parquet" or "ipc" (Arrow). Defaults to "parquet".
+        batch_size (int, optional): Number of rows to buffer before writing. Defaults to 50,000.
+
+    Returns:
+        int: Number of rows exported.
+    """
+
+    assert export_format in EXPORT_FORMATS, f"Export format must be one of {EXPORT_FORMATS}"
+
+    num_rows = 0
+
+    def batches() -> Iterator[pa.RecordBatch]:
+        nonlocal num_rows
+
+        rows = []
+        for doc in docs:
+            rows.extend(flatten_location_doc(doc))
+
+            if len(rows) >= batch_size:
+                num_rows += len(rows)
+                yield to_record_batch(rows)
+                rows = []
+
+        if rows:
+            num_rows += len(rows)
+            yield to_record_batch(rows)
+
+    ds.write_dataset(
+        batches(),
+        path,
+        schema=LOCATION_STATS_SCHEMA,
+        format=export_format,
+        partitioning=["section"],
+        partitioning_flavor="hive",
+        basename_template=f"part-{datetime.now():%Y%m%d%H%M%S%f}-{{i}}.{export_format}",
+        existing_data_behavior="overwrite_or_ignore",
+    )
+
+    logger.info(f"Exported {num_rows} rows to {path}")
+
+    return num_rows
+
+
+def export_location_stats_index(
+    es_client: Elasticsearch, path: str, query: Dict[str, Any] = None, export_format: str = "parquet"
+) -> int:
+    """
+    Streams every document in the `location_stats` index, or the ones matching `query`, into columnar files.
+
+    Realtor payloads stored by hash are fetched in batches as the documents stream through.
+
+    Args:
+        es_client (Elasticsearch): Elasticsearch client.
+        path (str): Directory to export to.
+        query (Dict[str, Any], optional): Elasticsearch query to filter the documents. Defaults to all documents.
+        export_format (str, optional): "parquet" or "ipc" (Arrow). Defaults to "parquet".
+
+    Returns:
+        int: Number of rows exported.
+    """
+
+    hits = scan(es_client, index=Config.ELASTICSEARCH_INDEX, query={"query": query or {"match_all": {}}})
+    docs = PayloadStore(es_client).hydrate_stream(hit["_source"] for hit in hits)
+
+    return export_location_docs(docs, path, export_format=export_format)
+
+
+def load_location_stats(path: str, export_format: str = "parquet", sections: List[str] = None) -> pd.DataFrame:
+    """
+    Loads exported location stats, memory mapping the files.
+
+    Args:
+        path (str): Directory the stats were exported to.
+        export_format (str, optional): "parquet" or "ipc" (Arrow). Defaults to "parquet".
+        sections (List[str], optional): Only load these sections, i.e ["income"]. Defaults to all sections.
+
+    Returns:
+        pd.DataFrame: One row per stat per location snapshot.
+    """
+
+    dataset = ds.dataset(
+        path,
+        schema=LOCATION_STATS_SCHEMA,
+        format=export_format,
+        partitioning="hive",
+        filesystem=LocalFileSystem(use_mmap=True),
+    )
+
+    table = dataset.to_table(filter=ds.field("section").isin(sections) if sections else None)
+
+    return table.to_pandas()
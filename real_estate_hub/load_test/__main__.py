@@ -0,0 +1,93 @@
+"""
+Load tests the app's lookup flow against local stand-ins for Elasticsearch and the Google Maps, Realtor and Zolo APIs.
+
+Usage:
+    python -m real_estate_hub.load_test --sessions 1,2,4,8,16,32 --stage-duration 30 --upstream-latency 0.2
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+import pandas as pd
+from elasticsearch import Elasticsearch
+from loguru import logger
+
+from real_estate_hub import quota
+from real_estate_hub.data_feeds.nearby_places_index import NearbyPlacesIndex
+from real_estate_hub.load_test.harness import AppLookupFlow, LoadTest, get_breaking_point
+from real_estate_hub.load_test.stand_ins import StandInElasticsearch, StubUpstreams
+from real_estate_hub.quota import UsageLedger
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default="1,2,4,8,16,32,64", help="Concurrent sessions of each stage.")
+    parser.add_argument("--stage-duration", type=float, default=30, help="Seconds to run each stage for.")
+    parser.add_argument("--repeat-ratio", type=float, default=0.8, help="Share of lookups for seen locations.")
+    parser.add_argument("--think-time", type=float, default=0, help="Seconds each session waits between lookups.")
+    parser.add_argument("--upstream-latency", type=float, default=0.1, help="Seconds each stubbed API call takes.")
+    parser.add_argument("--upstream-failure-rate", type=float, default=0, help="Share of stubbed API calls that fail.")
+    parser.add_argument("--elasticsearch-latency", type=float, default=0.01, help="Seconds each ES request takes.")
+    parser.add_argument("--max-error-rate", type=float, default=0.01, help="Error rate the app breaks at.")
+    parser.add_argument("--max-p95", type=float, default=2.0, help="95th percentile latency the app breaks at.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for picking locations.")
+    parser.add_argument("--output", default=None, help="CSV file to write the stage results to.")
+    parser.add_argument("--log-level", default="WARNING", help="Log level of the app's logs.")
+
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    session_counts = [int(sessions) for sessions in args.sessions.split(",")]
+
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level)
+
+    with tempfile.TemporaryDirectory() as workdir, StandInElasticsearch(
+        latency=args.elasticsearch_latency
+    ) as elasticsearch, StubUpstreams(latency=args.upstream_latency, failure_rate=args.upstream_failure_rate) as stubs:
+        os.environ.update(stubs.env)
+
+        # Keep the stubbed calls out of the real usage ledger
+        quota._usage_ledger = UsageLedger(os.path.join(workdir, "api_usage.jsonl"))
+
+        flow = AppLookupFlow(
+            Elasticsearch(elasticsearch.url),
+            NearbyPlacesIndex(os.path.join(workdir, "nearby_places.json")),
+            google_api_key="load-test",
+            rapid_api_key="load-test",
+        )
+        load_test = LoadTest(
+            flow.lookup,
+            [f"{number} Stand-in Street, Toronto" for number in range(1, 100001)],
+            repeat_ratio=args.repeat_ratio,
+            think_time=args.think_time,
+            get_cache_entries=lambda: flow.cache_entries,
+            seed=args.seed,
+        )
+
+        stages = load_test.ramp(session_counts, args.stage_duration, args.max_error_rate, args.max_p95)
+        upstream_requests = pd.Series(stubs.requests, name="requests", dtype=int).sort_index()
+
+    with pd.option_context("display.float_format", "{:.3f}".format, "display.width", 200):
+        print(stages.to_string(index=False))
+        print()
+        print(upstream_requests.to_string())
+        print()
+
+    breaking_point = get_breaking_point(stages, args.max_error_rate, args.max_p95)
+
+    if breaking_point is None:
+        print(f"Didn't break up to {stages['sessions'].max()} sessions")
+    else:
+        print(f"Broke at {breaking_point} sessions, {stages['throughput'].max():.2f} lookups/s at most")
+
+    if args.output:
+        stages.to_csv(args.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
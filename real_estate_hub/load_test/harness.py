@@ -0,0 +1,333 @@
+import itertools
+import os
+import random
+import resource
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from elasticsearch import Elasticsearch
+
+from real_estate_hub.config import Config
+from real_estate_hub.data_feeds.google_geo import GoogleGeo
+from real_estate_hub.data_feeds.location_stats import LocationStatsGenerator
+from real_estate_hub.data_feeds.nearby_places_index import NearbyPlacesIndex
+from real_estate_hub.data_feeds.web.zolo_scraper import ZoloScraper
+from real_estate_hub.location_aliases import LocationAliasIndex
+from real_estate_hub.payload_store import PayloadStore
+from real_estate_hub.profiles import lookup_profile
+
+# Tables and charts the app builds from the location stats on every page load
+RENDERED_SECTIONS = [
+    "get_general_stats",
+    "get_income",
+    "get_marital_status",
+    "get_education",
+    "get_language",
+    "get_age_of_home_distribution",
+    "get_age_distribution",
+    "get_children_at_home",
+    "get_rent_or_owned",
+    "get_occupations",
+]
+
+
+def get_rss_mb() -> float:
+    """Gets the resident memory of this process in MB, falling back to the peak where /proc isn't available."""
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2
+    except OSError:
+        # Linux reports the peak in KB, macOS in bytes
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024
+
+
+class AppLookupFlow(object):
+    """
+    Replays the single location lookup of `app/main.py` without Streamlit.
+
+    Each lookup runs `lookup_profile`, the same data flow the app runs, then builds the page's tables from the location
+    stats. The app's `st.cache` functions are replaced by unbounded dicts shared by every session, which is how
+    `st.cache` behaves within a pod, so memory growth from the caches shows up in the results.
+
+    Args:
+        es_client (Elasticsearch): Elasticsearch client.
+        places_index (NearbyPlacesIndex): Nearby places index shared by every session.
+        google_api_key (str, optional): Google API key. Defaults to the GOOGLE_API_KEY environment variable.
+        rapid_api_key (str, optional): RapidAPI key. Defaults to the RAPID_API_KEY environment variable.
+    """
+
+    def __init__(
+        self,
+        es_client: Elasticsearch,
+        places_index: NearbyPlacesIndex,
+        google_api_key: str = os.environ.get("GOOGLE_API_KEY"),
+        rapid_api_key: str = os.environ.get("RAPID_API_KEY"),
+    ):
+        self.es_client = es_client
+        self.alias_index = LocationAliasIndex(es_client)
+        self.payload_store = PayloadStore(es_client)
+        self.places_index = places_index
+        self.google_api_key = google_api_key
+        self.rapid_api_key = rapid_api_key
+
+        self.caches: Dict[str, Dict[Any, Any]] = {"google_directions": {}, "location_data": {}, "zolo_scraper": {}}
+
+        self._cache_lock = threading.Lock()
+
+        # The app expects the profile index to exist already
+        self.es_client.options(ignore_status=400).indices.create(index=Config.ELASTICSEARCH_INDEX)
+        self.alias_index.create_index()
+        self.payload_store.create_index()
+
+    @property
+    def cache_entries(self) -> int:
+        return sum(len(cache) for cache in self.caches.values())
+
+    def lookup(self, location: str) -> Dict[str, Any]:
+        """
+        Looks up a location like a user searching for it in the app.
+
+        Args:
+            location (str): Location to look up.
+
+        Raises:
+            LocationNotFoundError: If the location can't be geocoded and has never been profiled.
+            ProfileUnavailableError: If the data providers are unavailable and there's no profile to fall back on.
+
+        Returns:
+            Dict[str, Any]: Profile document the page was built from.
+        """
+
+        lookup = lookup_profile(
+            self.es_client,
+            location,
+            self.places_index,
+            self._get_google_directions,
+            self._get_location_data,
+            self._get_zolo_scraper,
+            rapid_api_key=self.rapid_api_key,
+        )
+
+        for section in RENDERED_SECTIONS:
+            getattr(lookup["location_stats"], section)()
+
+        return lookup["profile"]
+
+    def _get_google_directions(self, location: str, lat: float = None, long: float = None) -> GoogleGeo:
+        return self._cached(
+            "google_directions",
+            (location, lat, long),
+            GoogleGeo,
+            location,
+            lat=lat,
+            long=long,
+            google_api_key=self.google_api_key,
+            places_index=self.places_index,
+        )
+
+    def _get_location_data(self, lat: float, long: float) -> LocationStatsGenerator:
+        return self._cached("location_data", (lat, long), LocationStatsGenerator, lat, long, self.rapid_api_key)
+
+    def _get_zolo_scraper(self, address: str) -> ZoloScraper:
+        return self._cached("zolo_scraper", address, ZoloScraper, address)
+
+    def _cached(self, cache: str, key: Any, func: Callable, *args, **kwargs) -> Any:
+        # Like st.cache, concurrent misses on the same key both compute the value
+        if key in self.caches[cache]:
+            return self.caches[cache][key]
+
+        value = func(*args, **kwargs)
+
+        with self._cache_lock:
+            self.caches[cache][key] = value
+
+        return value
+
+
+class LoadTest(object):
+    """
+    Ramps up concurrent sessions running the app's lookup flow and measures how a single app pod holds up.
+
+    Each session is a thread, like Streamlit runs each browser session's script on its own thread in one process. A
+    session looks up a popular location, one already looked up, with probability `repeat_ratio` and a new location
+    otherwise, then waits `think_time` seconds before the next lookup.
+
+    Args:
+        lookup (Callable[[str], Any]): Looks up a location, i.e `AppLookupFlow.lookup`.
+        locations (List[str]): Locations sessions look up, in the order they're first looked up.
+        repeat_ratio (float, optional): Share of lookups for locations that were looked up before. Defaults to 0.8.
+        think_time (float, optional): Seconds each session waits between lookups. Defaults to 0.
+        get_cache_entries (Callable[[], int], optional): Gets the number of entries in the app's caches.
+        seed (int, optional): Seed for picking locations. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        lookup: Callable[[str], Any],
+        locations: List[str],
+        repeat_ratio: float = 0.8,
+        think_time: float = 0,
+        get_cache_entries: Optional[Callable[[], int]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.lookup = lookup
+        self.locations = locations
+        self.repeat_ratio = repeat_ratio
+        self.think_time = think_time
+        self.get_cache_entries = get_cache_entries
+
+        self._random = random.Random(seed)
+        self._next_location = itertools.count()
+        self._looked_up = 0
+        self._lock = threading.Lock()
+
+    def pick_location(self) -> str:
+        """Picks the next location a session looks up."""
+
+        with self._lock:
+            if self._looked_up and (
+                self._random.random() < self.repeat_ratio or self._looked_up >= len(self.locations)
+            ):
+                return self.locations[self._random.randrange(self._looked_up)]
+
+            self._looked_up += 1
+
+            return self.locations[next(self._next_location)]
+
+    def run_stage(self, sessions: int, duration: float) -> Dict[str, Any]:
+        """
+        Runs `sessions` concurrent sessions for `duration` seconds.
+
+        Args:
+            sessions (int): Number of concurrent sessions.
+            duration (float): Seconds to run for.
+
+        Returns:
+            Dict[str, Any]: Stage results, the number of lookups and errors, throughput in lookups per second,
+                latency percentiles in seconds, resident memory and its growth over the stage in MB, the number of
+                cache entries and the most common error.
+        """
+
+        latencies, errors = [], []
+        results_lock = threading.Lock()
+        rss_before = get_rss_mb()
+        deadline = time.monotonic() + duration
+
+        def run_session():
+            while time.monotonic() < deadline:
+                location = self.pick_location()
+                start = time.perf_counter()
+
+                try:
+                    self.lookup(location)
+                except Exception as e:
+                    with results_lock:
+                        errors.append(type(e).__name__)
+                else:
+                    with results_lock:
+                        latencies.append(time.perf_counter() - start)
+
+                if self.think_time:
+                    time.sleep(self.think_time)
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=run_session, daemon=True) for _ in range(sessions)]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        elapsed = time.monotonic() - start
+        lookups = len(latencies) + len(errors)
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if latencies else (np.nan, np.nan, np.nan)
+        rss_after = get_rss_mb()
+
+        return {
+            "sessions": sessions,
+            "lookups": lookups,
+            "errors": len(errors),
+            "error_rate": len(errors) / lookups if lookups else 0.0,
+            "throughput": len(latencies) / elapsed,
+            "p50": p50,
+            "p95": p95,
+            "p99": p99,
+            "max": max(latencies, default=np.nan),
+            "rss_mb": rss_after,
+            "rss_growth_mb": rss_after - rss_before,
+            "cache_entries": self.get_cache_entries() if self.get_cache_entries else None,
+            "top_error": Counter(errors).most_common(1)[0][0] if errors else None,
+        }
+
+    def ramp(
+        self, session_counts: List[int], stage_duration: float, max_error_rate: float = 0.01, max_p95: float = 2.0
+    ) -> pd.DataFrame:
+        """
+        Runs a stage for each number of sessions, stopping after the first stage past the breaking point.
+
+        Args:
+            session_counts (List[int]): Numbers of concurrent sessions to run, in increasing order.
+            stage_duration (float): Seconds to run each stage for.
+            max_error_rate (float, optional): Highest acceptable share of failed lookups. Defaults to 0.01.
+            max_p95 (float, optional): Highest acceptable 95th percentile latency in seconds. Defaults to 2.0.
+
+        Returns:
+            pd.DataFrame: One row of results per stage, see `run_stage`.
+        """
+
+        stages = []
+
+        for sessions in session_counts:
+            stages.append(self.run_stage(sessions, stage_duration))
+
+            if get_breaking_point(pd.DataFrame(stages), max_error_rate, max_p95) is not None:
+                break
+
+        return pd.DataFrame(stages)
+
+
+def get_breaking_point(
+    stages: pd.DataFrame, max_error_rate: float = 0.01, max_p95: float = 2.0, min_scaling: float = 0.1
+) -> Optional[int]:
+    """
+    Gets the number of sessions at which the app broke.
+
+    A stage is broken if too many lookups failed, the 95th percentile latency is over budget, or throughput stopped
+    scaling, i.e it grew less than `min_scaling` of the growth in sessions since the previous stage.
+
+    Args:
+        stages (pd.DataFrame): Stage results from `LoadTest.ramp`.
+        max_error_rate (float, optional): Highest acceptable share of failed lookups. Defaults to 0.01.
+        max_p95 (float, optional): Highest acceptable 95th percentile latency in seconds. Defaults to 2.0.
+        min_scaling (float, optional): Lowest acceptable throughput growth relative to session growth. Defaults to
+            0.1.
+
+    Returns:
+        Optional[int]: Sessions of the first broken stage, None if no stage broke.
+    """
+
+    previous = None
+
+    for stage in stages.itertuples():
+        stopped_scaling = (
+            previous is not None
+            and stage.sessions > previous.sessions
+            and previous.throughput > 0
+            and (stage.throughput / previous.throughput - 1) < min_scaling * (stage.sessions / previous.sessions - 1)
+        )
+
+        if stage.error_rate > max_error_rate or not stage.p95 <= max_p95 or stopped_scaling:
+            return stage.sessions
+
+        previous = stage
+
+    return None
@@ -0,0 +1,552 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+# Size of each section in `Data` of the Realtor API statistics response, matching real responses
+REALTOR_SECTION_SIZES = [9, 4, 11, 5, 6, 6, 16, 7, 6, 2, 8, 10]
+
+NEARBY_PLACE_TYPES = ["school", "park", "restaurant", "supermarket", "transit_station", "cafe", "gym", "bank"]
+
+DATE_MATH_UNITS = {"d": "days", "h": "hours", "m": "minutes", "s": "seconds"}
+
+
+def get_field(doc: Dict[str, Any], field: str) -> Any:
+    """Gets a dotted field, i.e "location_stats.asof_date", from a document, ignoring `.keyword` subfields."""
+
+    value = doc
+
+    for key in re.sub(r"\.keyword$", "", field).split("."):
+        if not isinstance(value, dict):
+            return None
+
+        value = value.get(key)
+
+    return value
+
+
+def parse_date_math(value: Any) -> Any:
+    """Parses Elasticsearch date math like "now-31d" into a datetime, leaving other values as is."""
+
+    match = re.fullmatch(r"now(?:-(\d+)([dhms]))?", str(value))
+
+    if not match:
+        return value
+
+    offset = timedelta(**{DATE_MATH_UNITS[match.group(2)]: int(match.group(1))}) if match.group(1) else timedelta()
+
+    return datetime.now() - offset
+
+
+def compare_values(doc_value: Any, bound: Any) -> Tuple[Any, Any]:
+    """Makes a document value and a range bound comparable, parsing dates when either side is one."""
+
+    bound = parse_date_math(bound)
+
+    if isinstance(bound, datetime) and isinstance(doc_value, str):
+        return datetime.fromisoformat(doc_value), bound
+
+    return doc_value, bound
+
+
+def tokenize(text: Any) -> List[str]:
+    return re.findall(r"\w+", str(text).lower())
+
+
+def matches(doc: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    """
+    Whether a document matches a query, for the subset of the query DSL the app and ETL use.
+
+    Supports `bool`, `match_all`, `match_phrase`, `term`, `terms` and `range` queries.
+
+    Args:
+        doc (Dict[str, Any]): Document source.
+        query (Dict[str, Any]): Query.
+
+    Raises:
+        ValueError: If the query type isn't supported.
+
+    Returns:
+        bool: True if the document matches.
+    """
+
+    ((query_type, clause),) = query.items()
+
+    if query_type == "match_all":
+        return True
+
+    if query_type == "bool":
+        must = clause.get("must", []) + clause.get("filter", [])
+        should = clause.get("should", [])
+        minimum_should_match = clause.get("minimum_should_match", 0 if must else 1) if should else 0
+
+        return (
+            all(matches(doc, sub_query) for sub_query in must)
+            and not any(matches(doc, sub_query) for sub_query in clause.get("must_not", []))
+            and sum(matches(doc, sub_query) for sub_query in should) >= minimum_should_match
+        )
+
+    ((field, value),) = clause.items()
+    doc_value = get_field(doc, field)
+
+    if query_type == "match_phrase":
+        phrase, tokens = tokenize(value), tokenize(doc_value)
+
+        return any(tokens[i : i + len(phrase)] == phrase for i in range(len(tokens) - len(phrase) + 1))
+
+    if query_type == "term":
+        return doc_value == (value["value"] if isinstance(value, dict) else value)
+
+    if query_type == "terms":
+        return doc_value in value
+
+    if query_type == "range":
+        if doc_value is None:
+            return False
+
+        operators = {
+            "gte": lambda a, b: a >= b,
+            "gt": lambda a, b: a > b,
+            "lte": lambda a, b: a <= b,
+            "lt": lambda a, b: a < b,
+        }
+
+        return all(operators[op](*compare_values(doc_value, bound)) for op, bound in value.items() if op in operators)
+
+    raise ValueError(f"Unsupported query type {query_type}")
+
+
+class StandInElasticsearch(object):
+    """
+    In-memory stand-in for the parts of the Elasticsearch REST API the app and ETL use, served over HTTP.
+
+    The real Elasticsearch client talks to it like a cluster, so load tests exercise the client, serialization and
+    connection pooling without a cluster. Supports creating indices, indexing, `_search`, `_msearch`, `_mget` and
+    `_bulk`, with the query subset in `matches`.
+
+    Args:
+        host (str, optional): Host to serve on. Defaults to "127.0.0.1".
+        port (int, optional): Port to serve on, 0 picks a free one. Defaults to 0.
+        latency (float, optional): Seconds to wait before every response, to mimic a remote cluster. Defaults to 0.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0):
+        self.latency = latency
+        self.indices: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.requests = 0
+
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInElasticsearch":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StandInElasticsearch":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def count(self, index: str) -> int:
+        with self._lock:
+            return len(self.indices.get(index, {}))
+
+    def search(self, index: str, body: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        with self._lock:
+            if index not in self.indices:
+                return 404, self._error("index_not_found_exception", f"no such index [{index}]")
+
+            docs = [
+                (doc_id, source)
+                for doc_id, source in self.indices[index].items()
+                if matches(source, body.get("query", {"match_all": {}}))
+            ]
+
+        for sort in reversed(body.get("sort", [])):
+            ((field, order),) = sort.items() if isinstance(sort, dict) else [(sort, {"order": "asc"})]
+            descending = (order["order"] if isinstance(order, dict) else order) == "desc"
+
+            # Missing values go last either way, like Elasticsearch
+            present = [doc for doc in docs if get_field(doc[1], field) is not None]
+            missing = [doc for doc in docs if get_field(doc[1], field) is None]
+            docs = sorted(present, key=lambda doc: get_field(doc[1], field), reverse=descending) + missing
+
+        hits = [
+            {"_index": index, "_id": doc_id, "_score": None, "_source": source}
+            for doc_id, source in docs[: body.get("size", 10)]
+        ]
+
+        return 200, {
+            "took": 1,
+            "timed_out": False,
+            "hits": {"total": {"value": len(docs), "relation": "eq"}, "max_score": None, "hits": hits},
+        }
+
+    def index_doc(self, index: str, source: Dict[str, Any], doc_id: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+        doc_id = doc_id or uuid.uuid4().hex
+
+        with self._lock:
+            created = doc_id not in self.indices.setdefault(index, {})
+            self.indices[index][doc_id] = source
+
+        return 201 if created else 200, {
+            "_index": index,
+            "_id": doc_id,
+            "result": "created" if created else "updated",
+        }
+
+    def mget(self, index: str, ids: List[str]) -> Tuple[int, Dict[str, Any]]:
+        with self._lock:
+            if index not in self.indices:
+                return 404, self._error("index_not_found_exception", f"no such index [{index}]")
+
+            docs = self.indices[index]
+
+            return 200, {
+                "docs": [
+                    {"_index": index, "_id": doc_id, "found": doc_id in docs, "_source": docs.get(doc_id)}
+                    for doc_id in ids
+                ]
+            }
+
+    def bulk(self, lines: List[Dict[str, Any]], default_index: Optional[str] = None) -> Tuple[int, Dict[str, Any]]:
+        items = []
+        lines = iter(lines)
+
+        for action in lines:
+            ((op_type, meta),) = action.items()
+            index, doc_id = meta.get("_index", default_index), meta.get("_id")
+
+            if op_type == "delete":
+                with self._lock:
+                    found = self.indices.get(index, {}).pop(doc_id, None) is not None
+
+                items.append({op_type: {"_index": index, "_id": doc_id, "status": 200 if found else 404}})
+                continue
+
+            body = next(lines)
+
+            if op_type == "update":
+                with self._lock:
+                    existing = self.indices.get(index, {}).get(doc_id)
+
+                if existing is None and not body.get("doc_as_upsert"):
+                    items.append({op_type: {"_index": index, "_id": doc_id, "status": 404}})
+                    continue
+
+                body = {**(existing or {}), **body["doc"]}
+
+            if op_type == "create" and doc_id in self.indices.get(index, {}):
+                items.append({op_type: {"_index": index, "_id": doc_id, "status": 409}})
+                continue
+
+            status, result = self.index_doc(index, body, doc_id)
+            items.append({op_type: {**result, "status": status}})
+
+        return 200, {
+            "took": 1,
+            "errors": any(item[op]["status"] >= 300 for item in items for op in item),
+            "items": items,
+        }
+
+    def _error(self, error_type: str, reason: str, status: int = 404) -> Dict[str, Any]:
+        return {"error": {"type": error_type, "reason": reason}, "status": status}
+
+    def _route(self, method: str, path: str, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        parts = [unquote(part) for part in path.strip("/").split("/") if part]
+
+        with self._lock:
+            self.requests += 1
+
+        if not parts:
+            return 200, {"name": "stand-in", "version": {"number": "8.0.0", "build_flavor": "default"}}
+
+        if parts[-1] in ("_bulk", "_msearch"):
+            lines = [json.loads(line) for line in body.decode().splitlines() if line.strip()]
+            default_index = parts[0] if len(parts) > 1 else None
+
+            if parts[-1] == "_bulk":
+                return self.bulk(lines, default_index)
+
+            responses = [
+                {**self.search(header.get("index", default_index), search)[1], "status": 200}
+                for header, search in zip(lines[::2], lines[1::2])
+            ]
+
+            return 200, {"took": 1, "responses": responses}
+
+        index = parts[0]
+        payload = json.loads(body) if body else {}
+
+        if len(parts) == 1 and method == "PUT":
+            with self._lock:
+                if index in self.indices:
+                    return 400, self._error(
+                        "resource_already_exists_exception", f"index [{index}] already exists", status=400
+                    )
+
+                self.indices[index] = {}
+
+            return 200, {"acknowledged": True, "index": index}
+
+        if parts[1] == "_search":
+            return self.search(index, payload)
+
+        if parts[1] == "_mget":
+            return self.mget(index, payload["ids"])
+
+        if parts[1] == "_doc" and method in ("POST", "PUT"):
+            return self.index_doc(index, payload, parts[2] if len(parts) > 2 else None)
+
+        return 404, self._error("stand_in_exception", f"{method} {path} isn't supported by the stand-in")
+
+    def _make_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def handle_request(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+
+                status, response = stand_in._route(self.command, urlparse(self.path).path, body)
+                data = json.dumps(response).encode()
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("X-Elastic-Product", "Elasticsearch")
+                self.end_headers()
+
+                if self.command != "HEAD":
+                    self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = handle_request
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class StubUpstreams(object):
+    """
+    Serves deterministic stand-ins for the Google Maps, Realtor and Zolo APIs over HTTP.
+
+    Point the data feeds at it with the GOOGLE_MAPS_API_URL, RAPID_API_REALTOR_URL and ZOLO_URL environment variables,
+    see `env`. Responses are derived from a hash of the request, so the same location always gets the same
+    coordinates, stats and places.
+
+    Args:
+        host (str, optional): Host to serve on. Defaults to "127.0.0.1".
+        port (int, optional): Port to serve on, 0 picks a free one. Defaults to 0.
+        latency (float, optional): Seconds to wait before every response, to mimic the real APIs. Defaults to 0.
+        failure_rate (float, optional): Share of requests answered with a 503, to mimic outages. Defaults to 0.
+        addresses (Dict[str, str], optional): Address each spelling geocodes to, like Google resolving
+            "1 Bedford Rd" to "One Bedford Road, Toronto". Other spellings geocode to themselves. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0,
+        failure_rate: float = 0,
+        addresses: Optional[Dict[str, str]] = None,
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.addresses = {spelling.lower(): address for spelling, address in (addresses or {}).items()}
+        self.requests: Dict[str, int] = {}
+
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+
+        return f"http://{host}:{port}"
+
+    @property
+    def env(self) -> Dict[str, str]:
+        """Environment variables pointing the data feeds at the stubs."""
+
+        return {
+            "GOOGLE_MAPS_API_URL": f"{self.url}/maps/api",
+            "RAPID_API_REALTOR_URL": f"{self.url}/realtor/properties/get-statistics",
+            "ZOLO_URL": f"{self.url}/zolo",
+        }
+
+    def start(self) -> "StubUpstreams":
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "StubUpstreams":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def geocode(self, params: Dict[str, str]) -> Dict[str, Any]:
+        address = params.get("address", "")
+        address = self.addresses.get(address.lower(), address)
+        rng = self._get_rng(address.lower())
+
+        return {
+            "status": "OK",
+            "results": [
+                {
+                    "formatted_address": f"{address.title()}, ON, Canada",
+                    "geometry": {"location": {"lat": rng.uniform(43.6, 43.8), "lng": rng.uniform(-79.55, -79.2)}},
+                }
+            ],
+        }
+
+    def directions(self, params: Dict[str, str]) -> Dict[str, Any]:
+        minutes = self._get_rng(params.get("origin", ""), params.get("mode", "")).randint(10, 75)
+
+        return {
+            "status": "OK",
+            "routes": [{"legs": [{"duration": {"text": f"{minutes} mins", "value": minutes * 60}}]}],
+        }
+
+    def nearby_places(self, params: Dict[str, str]) -> Dict[str, Any]:
+        lat, long = (float(coord) for coord in params.get("location", "43.65,-79.38").split(","))
+        rng = self._get_rng(params["location"])
+
+        results = [
+            {
+                "place_id": hashlib.sha1(f"{params['location']}:{i}".encode()).hexdigest(),
+                "name": f"Stand-in Place {i}",
+                "geometry": {
+                    "location": {"lat": lat + rng.uniform(-0.004, 0.004), "lng": long + rng.uniform(-0.004, 0.004)}
+                },
+                "types": [rng.choice(NEARBY_PLACE_TYPES), "point_of_interest", "establishment"],
+            }
+            for i in range(20)
+        ]
+
+        return {"status": "OK", "results": results}
+
+    def location_stats(self, params: Dict[str, str]) -> Dict[str, Any]:
+        rng = self._get_rng(params.get("Latitude", ""), params.get("Longitude", ""))
+
+        data = [
+            {
+                "name": f"section_{section}",
+                "value": [
+                    {"key": f"Stat {section}.{i}", "value": str(rng.randint(0, 5000))}
+                    for i in range(REALTOR_SECTION_SIZES[section])
+                ],
+            }
+            for section in range(len(REALTOR_SECTION_SIZES))
+        ]
+
+        return {
+            "ErrorCode": {
+                "Id": 200,
+                "Description": "Success - OK",
+                "ProductName": "Realtor.ca API | Monday, January 10, 2022 12:00:00 PM",
+            },
+            "Data": data,
+        }
+
+    def sold_history(self, address: str) -> str:
+        rng = self._get_rng(address)
+        rows = "".join(
+            f"<tr><td>C{rng.randint(1000000, 9999999)}</td><td>2021-0{i + 1}-15</td><td>Sold</td>"
+            f"<td>${rng.randint(500, 2000)},000</td></tr>"
+            for i in range(3)
+        )
+
+        return (
+            "<html><body><table><thead><tr><th>MLS #</th><th>Date</th><th>Event</th><th>Price</th></tr></thead>"
+            f"<tbody>{rows}</tbody></table></body></html>"
+        )
+
+    def _get_rng(self, *seed: str) -> random.Random:
+        return random.Random(hashlib.sha1("|".join(seed).encode()).hexdigest())
+
+    def _route(self, path: str, params: Dict[str, str]) -> Tuple[int, str, str]:
+        routes = {
+            "/maps/api/geocode/json": self.geocode,
+            "/maps/api/directions/json": self.directions,
+            "/maps/api/place/nearbysearch/json": self.nearby_places,
+            "/realtor/properties/get-statistics": self.location_stats,
+        }
+
+        if path in routes:
+            return 200, "application/json", json.dumps(routes[path](params))
+
+        if path.startswith("/zolo/"):
+            return 200, "text/html", self.sold_history(path[len("/zolo/") :])
+
+        return 404, "application/json", json.dumps({"status": "NOT_FOUND"})
+
+    def _make_handler(self):
+        stubs = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                url = urlparse(self.path)
+
+                endpoint = "/zolo" if url.path.startswith("/zolo/") else url.path
+
+                with stubs._lock:
+                    stubs.requests[endpoint] = stubs.requests.get(endpoint, 0) + 1
+
+                if stubs.latency:
+                    time.sleep(stubs.latency)
+
+                if random.random() < stubs.failure_rate:
+                    status, content_type, body = 503, "application/json", json.dumps({"status": "UNAVAILABLE"})
+                else:
+                    params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                    status, content_type, body = stubs._route(url.path, params)
+
+                data = body.encode()
+
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,127 @@
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+
+from elasticsearch import Elasticsearch, NotFoundError
+from elasticsearch.helpers import bulk
+from loguru import logger
+
+from real_estate_hub.config import Config
+from real_estate_hub.utils import get_location_id, normalize_location
+
+LOCATION_ALIAS_MAPPINGS = {
+    "properties": {
+        "alias": {"type": "keyword"},
+        "location_id": {"type": "keyword"},
+        "latitude": {"type": "double"},
+        "longitude": {"type": "double"},
+        "formatted_address": {"type": "keyword"},
+        "updated_date": {"type": "date"},
+    }
+}
+
+
+class LocationAliasIndex(object):
+    """
+    Elasticsearch index mapping every normalized spelling of a location to its canonical id and coordinates.
+
+    Each alias is stored as its own document with the normalized alias as the id, so spellings that normalize to the
+    same string share a document and resolving a location is a single keyword query.
+    """
+
+    def __init__(self, es_client: Elasticsearch, index: str = Config.ELASTICSEARCH_ALIAS_INDEX):
+        self.es_client = es_client
+        self.index = index
+
+    def create_index(self):
+        """Creates the alias index with keyword mappings if it doesn't exist."""
+
+        # 400 means the index already exists, i.e another ETL shard created it
+        self.es_client.options(ignore_status=400).indices.create(index=self.index, mappings=LOCATION_ALIAS_MAPPINGS)
+
+    def resolve(self, location: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolves a location to a previously seen canonical location.
+
+        Args:
+            location (str): Location as entered by a user or listed in the ETL.
+
+        Returns:
+            Optional[Dict[str, Any]]: Alias document with `location_id`, `latitude`, `longitude` and
+                `formatted_address`, None if the location hasn't been seen before.
+        """
+
+        try:
+            results = self.es_client.search(
+                index=self.index, size=1, query={"term": {"alias": normalize_location(location)}}
+            )
+        except NotFoundError:
+            logger.warning(f"Alias index {self.index} doesn't exist yet")
+            return None
+
+        hits = results["hits"]["hits"]
+
+        return hits[0]["_source"] if hits else None
+
+    def resolve_many(self, locations: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Resolves many locations in one round trip, fetching their alias documents by id.
+
+        Args:
+            locations (List[str]): Locations to resolve.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Alias document for each location that has been seen before.
+        """
+
+        normalized = {location: normalize_location(location) for location in locations}
+
+        if not normalized:
+            return {}
+
+        try:
+            results = self.es_client.mget(index=self.index, ids=list(set(normalized.values())))
+        except NotFoundError:
+            logger.warning(f"Alias index {self.index} doesn't exist yet")
+            return {}
+
+        alias_docs = {doc["_id"]: doc["_source"] for doc in results["docs"] if doc.get("found")}
+
+        return {location: alias_docs[alias] for location, alias in normalized.items() if alias in alias_docs}
+
+    def register(self, aliases: Iterable[str], lat: float, long: float, formatted_address: str = None) -> str:
+        """
+        Maps aliases of a location, along with the address Google resolved it to, to its canonical location.
+
+        Args:
+            aliases (Iterable[str]): Spellings of the location.
+            lat (float): Latitude of the location.
+            long (float): Longitude of the location.
+            formatted_address (str, optional): Address Google resolved the location to.
+
+        Returns:
+            str: Canonical location id.
+        """
+
+        location_id = get_location_id(lat, long)
+        normalized_aliases = {normalize_location(alias) for alias in [*aliases, formatted_address] if alias}
+
+        alias_doc = {"location_id": location_id, "latitude": lat, "longitude": long, "updated_date": datetime.now()}
+
+        # Upsert so registering aliases without a formatted address keeps the one already stored
+        if formatted_address:
+            alias_doc["formatted_address"] = formatted_address
+
+        actions = (
+            {
+                "_op_type": "update",
+                "_index": self.index,
+                "_id": alias,
+                "doc": {"alias": alias, **alias_doc},
+                "doc_as_upsert": True,
+            }
+            for alias in normalized_aliases
+        )
+
+        bulk(self.es_client, actions)
+
+        return location_id
@@ -0,0 +1,274 @@
+import base64
+import hashlib
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List
+
+from elasticsearch import Elasticsearch, NotFoundError
+from elasticsearch.helpers import bulk
+from loguru import logger
+
+from real_estate_hub.config import Config
+
+PAYLOAD_MAPPINGS = {
+    "properties": {
+        "payload": {"type": "binary"},
+        "encoding": {"type": "keyword"},
+        "size": {"type": "integer"},
+        "compressed_size": {"type": "integer"},
+        "created_date": {"type": "date"},
+    }
+}
+
+PAYLOAD_ENCODING = "json+zlib"
+
+# Fields of the Realtor API response that change on every call even when the stats don't, i.e the timestamp in
+# `ErrorCode`. They're left out of stored payloads so unchanged stats hash the same, `asof_date` stays on the profile.
+VOLATILE_PAYLOAD_FIELDS = frozenset({"ErrorCode", "asof_date"})
+
+# Number of decoded payloads kept in memory, payloads never change so they never go stale
+PAYLOAD_CACHE_SIZE = 1024
+
+_payload_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_payload_cache_lock = threading.Lock()
+
+
+def encode_payload(payload: Dict[str, Any]) -> bytes:
+    """Serializes a payload to canonical JSON, so equal payloads always serialize to the same bytes."""
+
+    return json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+def hash_payload(payload: Dict[str, Any]) -> str:
+    """
+    Hashes the stats of a Realtor API payload.
+
+    Args:
+        payload (Dict[str, Any]): Realtor API payload, i.e the `location_stats` of a profile.
+
+    Returns:
+        str: SHA-256 hex digest of the payload without its volatile fields.
+    """
+
+    return hashlib.sha256(encode_payload(get_stored_payload(payload))).hexdigest()
+
+
+def get_stored_payload(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Gets the part of a Realtor API payload that's stored, leaving out the volatile fields."""
+
+    return {key: value for key, value in payload.items() if key not in VOLATILE_PAYLOAD_FIELDS}
+
+
+class PayloadStore(object):
+    """
+    Content addressed store of raw Realtor API payloads in Elasticsearch.
+
+    Each unique payload is stored once, compressed, with its hash as the document id. Profiles reference the payload
+    by hash in `location_stats.payload_hash` instead of embedding it, so snapshots of areas whose stats haven't
+    changed, and nearby locations in the same census area, share one stored payload. Decoded payloads are cached in
+    memory since a hash always maps to the same payload.
+    """
+
+    def __init__(self, es_client: Elasticsearch, index: str = Config.ELASTICSEARCH_PAYLOAD_INDEX):
+        self.es_client = es_client
+        self.index = index
+
+    def create_index(self):
+        """Creates the payload index if it doesn't exist."""
+
+        # 400 means the index already exists, i.e another ETL shard created it
+        self.es_client.options(ignore_status=400).indices.create(
+            index=self.index, mappings=PAYLOAD_MAPPINGS, settings={"index": {"codec": "best_compression"}}
+        )
+
+    def put_many(self, payloads: List[Dict[str, Any]]) -> List[str]:
+        """
+        Stores the payloads that aren't stored yet, checking which are in one request and storing them in another.
+
+        Args:
+            payloads (List[Dict[str, Any]]): Realtor API payloads.
+
+        Returns:
+            List[str]: Hash of each payload.
+        """
+
+        if not payloads:
+            return []
+
+        stored_payloads = [get_stored_payload(payload) for payload in payloads]
+        encoded = [encode_payload(stored_payload) for stored_payload in stored_payloads]
+        hashes = [hashlib.sha256(data).hexdigest() for data in encoded]
+
+        unique = dict(zip(hashes, encoded))
+        new_hashes = [payload_hash for payload_hash in unique if not self._is_cached(payload_hash)]
+
+        if new_hashes:
+            try:
+                results = self.es_client.mget(index=self.index, ids=new_hashes, source=False)
+                new_hashes = [doc["_id"] for doc in results["docs"] if not doc.get("found")]
+            except NotFoundError:
+                logger.warning(f"Payload index {self.index} doesn't exist yet")
+
+        if new_hashes:
+            actions = (self._make_create_action(payload_hash, unique[payload_hash]) for payload_hash in new_hashes)
+
+            # Another writer storing the same payload first is a conflict, which is fine since the payloads are equal
+            _, errors = bulk(self.es_client, actions, raise_on_error=False)
+
+            if errors := [error for error in errors if error["create"]["status"] != 409]:
+                raise RuntimeError(f"Could not store {len(errors)} payloads: {errors[:3]}")
+
+        logger.info(f"Stored {len(new_hashes)} new payloads, {len(unique) - len(new_hashes)} already stored")
+
+        for payload_hash, stored_payload in zip(hashes, stored_payloads):
+            self._cache(payload_hash, stored_payload)
+
+        return hashes
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Gets payloads by hash, fetching the ones that aren't cached in one request.
+
+        Args:
+            hashes (Iterable[str]): Payload hashes.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Payload of each hash that's stored.
+        """
+
+        hashes = list(dict.fromkeys(hashes))
+        payloads = {payload_hash: self._get_cached(payload_hash) for payload_hash in hashes}
+        missing = [payload_hash for payload_hash, payload in payloads.items() if payload is None]
+
+        if missing:
+            try:
+                results = self.es_client.mget(index=self.index, ids=missing)
+            except NotFoundError:
+                logger.warning(f"Payload index {self.index} doesn't exist yet")
+                results = {"docs": []}
+
+            for doc in results["docs"]:
+                if doc.get("found"):
+                    payloads[doc["_id"]] = json.loads(zlib.decompress(base64.b64decode(doc["_source"]["payload"])))
+                    self._cache(doc["_id"], payloads[doc["_id"]])
+
+        if not_found := [payload_hash for payload_hash, payload in payloads.items() if payload is None]:
+            logger.warning(f"Payloads {not_found} aren't stored")
+
+        return {payload_hash: payload for payload_hash, payload in payloads.items() if payload is not None}
+
+    def dehydrate(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Stores the Realtor payloads of profiles and replaces them with references to the stored payloads.
+
+        Args:
+            docs (List[Dict[str, Any]]): Profile documents with the full payload in `location_stats`.
+
+        Returns:
+            List[Dict[str, Any]]: Copies of the documents with `location_stats` replaced by the payload's `asof_date`
+                and `payload_hash`.
+        """
+
+        to_store = [
+            i for i, doc in enumerate(docs) if doc.get("location_stats") and "payload_hash" not in doc["location_stats"]
+        ]
+        hashes = dict(zip(to_store, self.put_many([docs[i]["location_stats"] for i in to_store])))
+
+        return [
+            {**doc, "location_stats": {"asof_date": doc["location_stats"].get("asof_date"), "payload_hash": hashes[i]}}
+            if i in hashes
+            else doc
+            for i, doc in enumerate(docs)
+        ]
+
+    def hydrate(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Replaces references to stored payloads in profiles with the payloads.
+
+        Profiles that embed their payload, i.e ones indexed before payloads were stored, are returned as is. Profiles
+        whose payload isn't stored are returned without `location_stats`, the same as profiles that never had stats.
+
+        Args:
+            docs (List[Dict[str, Any]]): Profile documents.
+
+        Returns:
+            List[Dict[str, Any]]: Copies of the documents with the full payload in `location_stats`.
+        """
+
+        payloads = self.get_many(
+            doc["location_stats"]["payload_hash"] for doc in docs if "payload_hash" in (doc.get("location_stats") or {})
+        )
+
+        hydrated = []
+        for doc in docs:
+            payload_hash = (doc.get("location_stats") or {}).get("payload_hash")
+
+            if payload_hash is None:
+                hydrated.append(doc)
+            elif payload_hash in payloads:
+                asof_date = doc["location_stats"].get("asof_date")
+                hydrated.append({**doc, "location_stats": {**payloads[payload_hash], "asof_date": asof_date}})
+            else:
+                hydrated.append({key: value for key, value in doc.items() if key != "location_stats"})
+
+        return hydrated
+
+    def hydrate_hits(self, results: Dict[str, Any]) -> Dict[str, Any]:
+        """Hydrates the profiles in an Elasticsearch search response in place, returning the response."""
+
+        hits = results["hits"]["hits"]
+
+        for hit, source in zip(hits, self.hydrate([hit["_source"] for hit in hits])):
+            hit["_source"] = source
+
+        return results
+
+    def hydrate_stream(self, docs: Iterable[Dict[str, Any]], batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """Hydrates a stream of profiles, fetching the payloads of each batch in one request."""
+
+        batch = []
+
+        for doc in docs:
+            batch.append(doc)
+
+            if len(batch) >= batch_size:
+                yield from self.hydrate(batch)
+                batch = []
+
+        yield from self.hydrate(batch)
+
+    def _make_create_action(self, payload_hash: str, data: bytes) -> Dict[str, Any]:
+        compressed = zlib.compress(data, 9)
+
+        return {
+            "_op_type": "create",
+            "_index": self.index,
+            "_id": payload_hash,
+            "payload": base64.b64encode(compressed).decode(),
+            "encoding": PAYLOAD_ENCODING,
+            "size": len(data),
+            "compressed_size": len(compressed),
+            "created_date": datetime.now(),
+        }
+
+    def _is_cached(self, payload_hash: str) -> bool:
+        with _payload_cache_lock:
+            return payload_hash in _payload_cache
+
+    def _get_cached(self, payload_hash: str) -> Any:
+        with _payload_cache_lock:
+            if payload_hash in _payload_cache:
+                _payload_cache.move_to_end(payload_hash)
+
+            return _payload_cache.get(payload_hash)
+
+    def _cache(self, payload_hash: str, payload: Dict[str, Any]):
+        with _payload_cache_lock:
+            _payload_cache[payload_hash] = payload
+            _payload_cache.move_to_end(payload_hash)
+
+            while len(_payload_cache) > PAYLOAD_CACHE_SIZE:
+                _payload_cache.popitem(last=False)
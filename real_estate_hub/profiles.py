@@ -0,0 +1,430 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from elasticsearch import Elasticsearch
+from loguru import logger
+
+from real_estate_hub.circuit_breaker import get_circuit_breaker, upstreams_available
+from real_estate_hub.config import Config
+from real_estate_hub.data_feeds.google_geo import GoogleGeo
+from real_estate_hub.data_feeds.location_stats import LocationStatsGenerator
+from real_estate_hub.data_feeds.nearby_places_index import NearbyPlacesIndex
+from real_estate_hub.data_feeds.web.zolo_scraper import ZoloScraper
+from real_estate_hub.location_aliases import LocationAliasIndex
+from real_estate_hub.payload_store import PayloadStore
+from real_estate_hub.utils import get_location_id
+
+# Upstream APIs a location profile is built from
+PROFILE_UPSTREAMS = ["google_maps", "realtor"]
+
+# How old a profile can be before the app fetches a fresh one
+PROFILE_MAX_AGE = "31d"
+
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+
+class LocationNotFoundError(Exception):
+    """Raised when a location can't be geocoded and has never been profiled."""
+
+
+class ProfileUnavailableError(Exception):
+    """Raised when the data providers are unavailable and there's no stored profile to fall back on."""
+
+
+def get_location_queries(location: str, alias: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Gets the queries matching profiles of a location, by its name or, if it resolved to an alias, its coordinates.
+
+    Args:
+        location (str): Location as entered by the user.
+        alias (Dict[str, Any], optional): Alias document the location resolved to.
+
+    Returns:
+        List[Dict[str, Any]]: Queries, any of which matches a profile of the location.
+    """
+
+    location_queries = [{"match_phrase": {"location": f"{location}"}}]
+
+    if alias:
+        location_queries.append(
+            {
+                "bool": {
+                    "filter": [{"term": {"latitude": alias["latitude"]}}, {"term": {"longitude": alias["longitude"]}}]
+                }
+            }
+        )
+
+    return location_queries
+
+
+def search_profiles(
+    es_client: Elasticsearch, location_queries: List[Dict[str, Any]], max_age: Optional[str] = PROFILE_MAX_AGE
+) -> Dict[str, Any]:
+    """
+    Searches for the latest profile matching any of the location queries, with its Realtor payload hydrated.
+
+    Args:
+        es_client (Elasticsearch): Elasticsearch client.
+        location_queries (List[Dict[str, Any]]): Queries from `get_location_queries`.
+        max_age (str, optional): Only match profiles processed within this long, i.e "31d", None for any age. Defaults
+            to `PROFILE_MAX_AGE`.
+
+    Returns:
+        Dict[str, Any]: Elasticsearch search response with at most one hit.
+    """
+
+    results = es_client.search(
+        index=Config.ELASTICSEARCH_INDEX,
+        size=1,
+        sort=[{"location_stats.asof_date": {"order": "desc"}}],
+        query={
+            "bool": {
+                "should": location_queries,
+                "minimum_should_match": 1,
+                "filter": [{"range": {"processed_date": {"gte": f"now-{max_age}"}}}] if max_age else [],
+            }
+        },
+    )
+
+    return PayloadStore(es_client).hydrate_hits(results)
+
+
+def get_missing_fields(profile: Dict[str, Any]) -> List[str]:
+    """
+    Gets the fields of a profile an upstream API failed to fill in, i.e commute times that came back as None.
+
+    Args:
+        profile (Dict[str, Any]): Profile document.
+
+    Returns:
+        List[str]: Missing fields, empty if the profile is complete.
+    """
+
+    missing = [field for field in ["location_stats", "nearby_places", "commute_times"] if profile.get(field) is None]
+    missing.extend(mode for mode, commute_time in (profile.get("commute_times") or {}).items() if not commute_time)
+
+    return missing
+
+
+def build_profile(location: str, lat: float, long: float, places_index: NearbyPlacesIndex = None) -> Dict[str, Any]:
+    """
+    Builds a location profile document from the upstream APIs.
+
+    Args:
+        location (str): Location the profile is for.
+        lat (float): Latitude of the location.
+        long (float): Longitude of the location.
+        places_index (NearbyPlacesIndex, optional): Index to serve nearby places from when it covers the location.
+
+    Raises:
+        ValueError: If the location stats, nearby places or commute times couldn't be fetched.
+
+    Returns:
+        Dict[str, Any]: Profile document for the `location_stats` index.
+    """
+
+    google_directions = GoogleGeo(location, lat=lat, long=long, places_index=places_index)
+    loc = LocationStatsGenerator(lat, long)
+    nearby_places = google_directions.get_nearby_places()
+    commute_times = {
+        "driving_commute_time": google_directions.get_commute_time("driving"),
+        "transit_commute_time": google_directions.get_commute_time("transit"),
+    }
+
+    profile = {
+        "location": location,
+        "location_id": get_location_id(lat, long),
+        "latitude": lat,
+        "longitude": long,
+        "location_stats": loc.location_data,
+        "nearby_places": nearby_places,
+        "commute_times": commute_times,
+        "processed_date": datetime.now(),
+    }
+
+    if missing := get_missing_fields(profile):
+        raise ValueError(f"Could not get {', '.join(missing)} for {location}.")
+
+    return profile
+
+
+def refresh_stale_profile(
+    es_client: Elasticsearch, location: str, lat: float, long: float, places_index: NearbyPlacesIndex = None
+) -> bool:
+    """
+    Rebuilds a stale profile on a background thread once the upstream APIs are available, and indexes it.
+
+    Only one refresh runs per location at a time.
+
+    Args:
+        es_client (Elasticsearch): Elasticsearch client.
+        location (str): Location to refresh.
+        lat (float): Latitude of the location.
+        long (float): Longitude of the location.
+        places_index (NearbyPlacesIndex, optional): Index to serve nearby places from when it covers the location.
+
+    Returns:
+        bool: True if a refresh was started, False if one is already running for the location.
+    """
+
+    location_id = get_location_id(lat, long)
+
+    with _refreshing_lock:
+        if location_id in _refreshing:
+            return False
+
+        _refreshing.add(location_id)
+
+    def refresh():
+        try:
+            time.sleep(max(get_circuit_breaker(name).seconds_until_retry() for name in PROFILE_UPSTREAMS))
+
+            doc = build_profile(location, lat, long, places_index)
+            es_client.index(index=Config.ELASTICSEARCH_INDEX, document=PayloadStore(es_client).dehydrate([doc])[0])
+            logger.info(f"Refreshed stale profile for {location}")
+        except Exception as e:
+            logger.warning(f"Could not refresh stale profile for {location}: {e}")
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(location_id)
+
+    threading.Thread(target=refresh, daemon=True).start()
+
+    return True
+
+
+def lookup_profile(
+    es_client: Elasticsearch,
+    location: str,
+    places_index: NearbyPlacesIndex,
+    get_google_directions: Callable[..., GoogleGeo],
+    get_location_data: Callable[[float, float], LocationStatsGenerator],
+    get_zolo_scraper: Callable[[str], ZoloScraper],
+    rapid_api_key: str = os.environ.get("RAPID_API_KEY"),
+) -> Dict[str, Any]:
+    """
+    Looks up the profile of a location, fetching whatever is missing or stale from the data feeds and indexing it.
+
+    This is the data half of the app's location lookup, the app renders the result. The data feeds are passed in as
+    getters so the app can cache them with `st.cache` and the load test harness with its own caches.
+
+    Other spellings of a location that was profiled before are matched to its profile by their alias or, once
+    geocoded, by their address, so each place has one profile. If the data providers are unavailable, the latest
+    profile is served regardless of its age and refreshed in the background once they're back.
+
+    Args:
+        es_client (Elasticsearch): Elasticsearch client.
+        location (str): Location as entered by the user.
+        places_index (NearbyPlacesIndex): Index to serve nearby places from, appended to when the lookup adds places.
+        get_google_directions (Callable[..., GoogleGeo]): Gets a `GoogleGeo` for a location and, if known, its
+            latitude and longitude.
+        get_location_data (Callable[[float, float], LocationStatsGenerator]): Gets the location stats for a latitude
+            and longitude from the Realtor API.
+        get_zolo_scraper (Callable[[str], ZoloScraper]): Gets a `ZoloScraper` for an address.
+        rapid_api_key (str, optional): RapidAPI key. Defaults to the RAPID_API_KEY environment variable.
+
+    Raises:
+        LocationNotFoundError: If the location can't be geocoded and has never been profiled.
+        ProfileUnavailableError: If the data providers are unavailable and there's no profile to fall back on.
+
+    Returns:
+        Dict[str, Any]: The `profile` document, its `location_stats` as a `LocationStatsGenerator`, the
+            `sold_history` from Zolo, None if there is none, whether the sold history is unavailable
+            (`sold_history_unavailable`) and whether the profile is `stale`.
+    """
+
+    alias_index = LocationAliasIndex(es_client)
+    existing_es_doc = False
+    update_doc = False
+    stale = False
+    geocoded = False
+
+    # Resolve other spellings of a location we've seen before to the coordinates of its existing profile
+    alias = alias_index.resolve(location)
+    location_queries = get_location_queries(location, alias)
+
+    if alias:
+        logger.info(f"Resolved {location} to location {alias['location_id']}")
+
+    results = search_profiles(es_client, location_queries)
+
+    # If the data providers are down, serve the latest profile we have no matter how old it is
+    if not results["hits"]["hits"] and not upstreams_available(PROFILE_UPSTREAMS):
+        logger.warning(f"Data providers unavailable, looking for a stale profile for {location}")
+
+        results = _search_stale_profiles(es_client, location_queries)
+        stale = True
+
+    # If we have a hit for a location in Elasticsearch, get the latitude and longitude for it
+    # Else get the latitude and longitude for the location from the Google API
+    if results["hits"]["hits"]:
+        if not stale:
+            logger.info(f"Found results for location {location} in Elasticsearch!")
+            existing_es_doc = True
+
+        lat, long = (
+            results["hits"]["hits"][0]["_source"]["latitude"],
+            results["hits"]["hits"][0]["_source"]["longitude"],
+        )
+        google_directions = get_google_directions(location, lat, long)
+    elif alias:
+        logger.info(f"No results found for location {location} in Elasticsearch, using its known coordinates")
+
+        lat, long = alias["latitude"], alias["longitude"]
+        google_directions = get_google_directions(location, lat, long)
+    else:
+        logger.info(f"No results found for location {location} in Elasticsearch!")
+
+        try:
+            google_directions = get_google_directions(location)
+            lat, long = google_directions.lat, google_directions.long
+        except Exception as e:
+            logger.error(f"Error getting location data from Google for {location}: {e}")
+
+            # A location we've profiled before can't be a bad address, so Google must be having issues
+            results = search_profiles(es_client, location_queries, max_age=None)
+
+            if not results["hits"]["hits"]:
+                raise LocationNotFoundError(f"Could not find {location}") from e
+
+            stale = True
+            lat, long = (
+                results["hits"]["hits"][0]["_source"]["latitude"],
+                results["hits"]["hits"][0]["_source"]["longitude"],
+            )
+            google_directions = get_google_directions(location, lat, long)
+        else:
+            geocoded = True
+
+            # A new spelling of a location we've profiled before, i.e "1 Bedford Rd" for "One Bedford Road, Toronto",
+            # geocodes to the same address, so look for its profile by the address' coordinates before creating one
+            known_location = (
+                alias_index.resolve(google_directions.formatted_address)
+                if google_directions.formatted_address
+                else None
+            )
+            location_queries = get_location_queries(location, known_location or {"latitude": lat, "longitude": long})
+            results = search_profiles(es_client, location_queries)
+
+            if results["hits"]["hits"]:
+                logger.info(f"Found results for location {location} in Elasticsearch by its geocoded address!")
+
+                existing_es_doc = True
+                lat, long = (
+                    results["hits"]["hits"][0]["_source"]["latitude"],
+                    results["hits"]["hits"][0]["_source"]["longitude"],
+                )
+            elif known_location:
+                lat, long = known_location["latitude"], known_location["longitude"]
+
+    source = results["hits"]["hits"][0]["_source"] if results["hits"]["hits"] else {}
+
+    # If location stats aren't in Elasticsearch, get it from the API
+    if "location_stats" in source:
+        logger.info(f"Using location stats from Elasticsearch for {location}")
+        loc_stats = LocationStatsGenerator(lat, long, rapid_api_key, location_data=source["location_stats"])
+    else:
+        logger.info(f"No location stats found in Elasticsearch for {location}")
+
+        try:
+            update_doc = True
+            loc_stats = get_location_data(lat, long)
+        except ValueError as e:
+            logger.error(f"Error getting location stats for {location}: {e}")
+
+            results = _search_stale_profiles(es_client, location_queries)
+            stale = True
+            source = results["hits"]["hits"][0]["_source"]
+            loc_stats = LocationStatsGenerator(lat, long, rapid_api_key, location_data=source["location_stats"])
+
+    if stale:
+        refresh_stale_profile(es_client, location, lat, long, places_index)
+
+    # Only a geocode ties a spelling to a place, a profile matched by phrase or served stale may be another place, i.e
+    # "Toronto" matching the profile of "1 Bedford Road, Toronto"
+    if geocoded:
+        alias_index.register([location], lat, long, formatted_address=google_directions.formatted_address)
+
+    # If nearby places aren't in Elasticsearch, get it from the API
+    if "nearby_places" in source:
+        logger.info(f"Using nearby places from Elasticsearch for {location}")
+        nearby_places = source["nearby_places"]
+    else:
+        logger.info(f"No nearby places found in Elasticsearch for {location}")
+
+        update_doc = True
+        nearby_places = google_directions.get_nearby_places()
+
+        # Only the new places are written, the ETL folds them into the snapshot when it saves the index
+        places_index.append()
+
+    # If commute times aren't in Elasticsearch, get it from the API
+    if "commute_times" in source:
+        logger.info(f"Using commute times from Elasticsearch for {location}")
+        commute_times = source["commute_times"]
+    else:
+        logger.info(f"No commute times found in Elasticsearch for {location}")
+
+        update_doc = True
+        commute_times = {
+            "driving_commute_time": google_directions.get_commute_time("driving"),
+            "transit_commute_time": google_directions.get_commute_time("transit"),
+        }
+
+    try:
+        sold_history = get_zolo_scraper(location).get_sold_history()
+        sold_history_unavailable = False
+    except Exception as e:
+        logger.error(f"Error getting sold history from Zolo for {location}: {e}")
+        sold_history = None
+        sold_history_unavailable = True
+
+    profile = {
+        "location": location,
+        "location_id": get_location_id(lat, long),
+        "latitude": lat,
+        "longitude": long,
+        "location_stats": loc_stats.location_data,
+        "nearby_places": nearby_places,
+        "commute_times": commute_times,
+        "processed_date": source["processed_date"] if stale else datetime.now(),
+    }
+
+    # Stale profiles are refreshed in the background instead, and so are profiles an upstream API failed to fill in,
+    # which are served as is but not indexed
+    if not stale and (missing := get_missing_fields(profile)):
+        logger.warning(f"Not indexing the profile for {location}, could not get {', '.join(missing)}")
+        refresh_stale_profile(es_client, location, lat, long, places_index)
+    elif not stale and (not existing_es_doc or update_doc):
+        # Store the Realtor payload once and reference it from the doc
+        doc = PayloadStore(es_client).dehydrate([profile])[0]
+
+        if existing_es_doc:
+            logger.info(f"Updating existing doc for {location} in Elasticsearch")
+            es_client.index(index=Config.ELASTICSEARCH_INDEX, document=doc, id=results["hits"]["hits"][0]["_id"])
+        else:
+            logger.info(f"Inserting new doc for for {location} into Elasticsearch")
+            es_client.index(index=Config.ELASTICSEARCH_INDEX, document=doc)
+
+    return {
+        "profile": profile,
+        "location_stats": loc_stats,
+        "sold_history": sold_history,
+        "sold_history_unavailable": sold_history_unavailable,
+        "stale": stale,
+    }
+
+
+def _search_stale_profiles(es_client: Elasticsearch, location_queries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Searches for the latest profile with location stats regardless of its age, to serve while it's refreshed."""
+
+    results = search_profiles(es_client, location_queries, max_age=None)
+
+    if not results["hits"]["hits"] or "location_stats" not in results["hits"]["hits"][0]["_source"]:
+        raise ProfileUnavailableError("Data providers are unavailable and there's no profile to fall back on")
+
+    return results
@@ -0,0 +1,369 @@
+import calendar
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from real_estate_hub.config import Config
+from real_estate_hub.data_feeds.nearby_places_index import NEARBY_PLACES_RADIUS_METRES, NearbyPlacesIndex
+from real_estate_hub.utils import file_lock, write_json_atomic
+
+# Monthly request limits for each upstream API, override with <API>_MONTHLY_QUOTA environment variables
+DEFAULT_MONTHLY_QUOTAS = {
+    "google_maps": 40000,
+    "realtor": 500,
+}
+
+# API calls to process one location: geocoding, the stats call, 2 commute times and up to 3 pages of nearby places
+GEOCODE_CALLS = {"google_maps": 1}
+LOCATION_STATS_CALLS = {"realtor": 1, "google_maps": 2}
+NEARBY_PLACES_CALLS = {"google_maps": 3}
+
+# Priority of locations that have never been processed, as if they were a year old
+NEVER_PROCESSED_AGE_DAYS = 365
+
+
+def get_monthly_quota(api: str) -> int:
+    """
+    Gets the monthly request limit for an API.
+
+    Args:
+        api (str): API name, i.e "realtor".
+
+    Returns:
+        int: Number of requests allowed per month.
+    """
+
+    return int(os.environ.get(f"{api.upper()}_MONTHLY_QUOTA", DEFAULT_MONTHLY_QUOTAS[api]))
+
+
+class UsageLedger(object):
+    """
+    Persistent, append only ledger of every call made to an upstream API.
+
+    Each call is appended as a JSON line, which is atomic for lines this small, so the app and every ETL shard can
+    record into the same file without locking. Calls are written to one file per month next to `path`, i.e
+    `api_usage-2022-05.jsonl`, so reading a month's usage never parses the months before it.
+    """
+
+    def __init__(self, path: str = os.environ.get("API_USAGE_LEDGER_PATH", Config.API_USAGE_LEDGER_PATH)):
+        self.path = os.path.expanduser(path)
+
+    def get_period_path(self, period: str = None) -> str:
+        """
+        Gets the ledger file of a month.
+
+        Args:
+            period (str, optional): Month as "YYYY-MM". Defaults to the current month.
+
+        Returns:
+            str: Path of the month's ledger file.
+        """
+
+        root, ext = os.path.splitext(self.path)
+
+        return f"{root}-{period or datetime.now().strftime('%Y-%m')}{ext}"
+
+    def record(self, api: str, endpoint: str, calls: int = 1):
+        """
+        Records calls made to an API endpoint.
+
+        Args:
+            api (str): API name, i.e "google_maps".
+            endpoint (str): Endpoint of the API, i.e "geocode".
+            calls (int, optional): Number of calls. Defaults to 1.
+        """
+
+        now = datetime.now()
+        entry = {"timestamp": now.isoformat(), "api": api, "endpoint": endpoint, "calls": calls}
+        path = self.get_period_path(now.strftime("%Y-%m"))
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        with open(path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def get_usage(self, period: str = None) -> Dict[str, Dict[str, int]]:
+        """
+        Gets the number of calls made to each API endpoint in a month.
+
+        Args:
+            period (str, optional): Month as "YYYY-MM". Defaults to the current month.
+
+        Returns:
+            Dict[str, Dict[str, int]]: Calls per endpoint for each API.
+        """
+
+        path = self.get_period_path(period)
+        usage = {}
+
+        if not os.path.exists(path):
+            return usage
+
+        with open(path) as f:
+            for line in f:
+                entry = json.loads(line)
+                endpoints = usage.setdefault(entry["api"], {})
+                endpoints[entry["endpoint"]] = endpoints.get(entry["endpoint"], 0) + entry["calls"]
+
+        return usage
+
+    def get_total_usage(self, period: str = None) -> Dict[str, int]:
+        """
+        Gets the number of calls made to each API in a month.
+
+        Args:
+            period (str, optional): Month as "YYYY-MM". Defaults to the current month.
+
+        Returns:
+            Dict[str, int]: Calls per API.
+        """
+
+        return {api: sum(endpoints.values()) for api, endpoints in self.get_usage(period).items()}
+
+
+_usage_ledger = None
+
+
+def get_usage_ledger() -> UsageLedger:
+    """Gets the ledger every API call is recorded into."""
+
+    global _usage_ledger
+
+    if _usage_ledger is None:
+        _usage_ledger = UsageLedger()
+
+    return _usage_ledger
+
+
+def record_api_call(api: str, endpoint: str):
+    """
+    Records a call to an API endpoint in the usage ledger.
+
+    Failing to record is logged rather than raised so accounting never breaks a request.
+
+    Args:
+        api (str): API name, i.e "google_maps".
+        endpoint (str): Endpoint of the API, i.e "geocode".
+    """
+
+    try:
+        get_usage_ledger().record(api, endpoint)
+    except OSError as e:
+        logger.warning(f"Could not record {api} {endpoint} call in the usage ledger: {e}")
+
+
+class QuotaPlanner(object):
+    """
+    Plans which locations an ETL run can afford to process with the quota left.
+
+    The calls each location needs are estimated after caches: locations with known coordinates don't need geocoding
+    and locations whose surroundings are already in the nearby places index don't need the Places API. Locations are
+    then picked by priority, how stale their data is times how valuable they are, until the budget is used up.
+    """
+
+    def __init__(self, ledger: UsageLedger = None, places_index: NearbyPlacesIndex = None):
+        self.ledger = ledger or get_usage_ledger()
+        self.places_index = places_index
+
+    def get_budget(self, spread_over_month: bool = True) -> Dict[str, int]:
+        """
+        Gets the number of calls left for each API.
+
+        Args:
+            spread_over_month (bool, optional): Only allow an even share of what's left for each remaining day of the
+                month, so nightly runs don't use up the quota in the first few days. Defaults to True.
+
+        Returns:
+            Dict[str, int]: Calls left per API.
+        """
+
+        usage = self.ledger.get_total_usage()
+        now = datetime.now()
+        days_left = calendar.monthrange(now.year, now.month)[1] - now.day + 1 if spread_over_month else 1
+
+        return {api: max(get_monthly_quota(api) - usage.get(api, 0), 0) // days_left for api in DEFAULT_MONTHLY_QUOTAS}
+
+    def estimate_calls(self, coordinates: Optional[Tuple[float, float]]) -> Dict[str, int]:
+        """
+        Estimates the calls needed to process a location.
+
+        Args:
+            coordinates (Optional[Tuple[float, float]]): Known latitude and longitude of the location, None if it
+                needs to be geocoded.
+
+        Returns:
+            Dict[str, int]: Calls per API.
+        """
+
+        calls = dict(LOCATION_STATS_CALLS)
+        extra_calls = []
+
+        if not coordinates:
+            extra_calls.append(GEOCODE_CALLS)
+
+        if not (
+            coordinates
+            and self.places_index is not None
+            and self.places_index.is_covered(*coordinates, NEARBY_PLACES_RADIUS_METRES)
+        ):
+            extra_calls.append(NEARBY_PLACES_CALLS)
+
+        for extra in extra_calls:
+            for api, count in extra.items():
+                calls[api] = calls.get(api, 0) + count
+
+        return calls
+
+    def estimate_total_calls(self, coordinates: Dict[str, Optional[Tuple[float, float]]]) -> Dict[str, int]:
+        """
+        Estimates the calls needed to process a list of locations.
+
+        Args:
+            coordinates (Dict[str, Optional[Tuple[float, float]]]): Known coordinates of each location, None if unknown.
+
+        Returns:
+            Dict[str, int]: Calls per API.
+        """
+
+        total = {}
+        for location_coordinates in coordinates.values():
+            for api, count in self.estimate_calls(location_coordinates).items():
+                total[api] = total.get(api, 0) + count
+
+        return total
+
+    def plan(
+        self,
+        coordinates: Dict[str, Optional[Tuple[float, float]]],
+        last_processed: Dict[str, datetime] = None,
+        values: Dict[str, float] = None,
+        budget: Dict[str, int] = None,
+    ) -> List[str]:
+        """
+        Picks the locations to process, highest priority first, without going over the budget.
+
+        Args:
+            coordinates (Dict[str, Optional[Tuple[float, float]]]): Known coordinates of each location, None if unknown.
+            last_processed (Dict[str, datetime], optional): When each location was last processed. Defaults to never.
+            values (Dict[str, float], optional): How valuable each location is. Defaults to 1 for every location.
+            budget (Dict[str, int], optional): Calls available per API. Defaults to `get_budget()`.
+
+        Returns:
+            List[str]: Locations to process, highest priority first.
+        """
+
+        last_processed = last_processed or {}
+        values = values or {}
+        budget = dict(budget or self.get_budget())
+        now = datetime.now()
+
+        def priority(location: str) -> float:
+            age = (now - last_processed[location]).days if location in last_processed else NEVER_PROCESSED_AGE_DAYS
+            return age * values.get(location, 1)
+
+        planned = []
+        for location in sorted(coordinates, key=priority, reverse=True):
+            calls = self.estimate_calls(coordinates[location])
+
+            # Keep going when a location doesn't fit since a cheaper one further down might
+            if all(budget.get(api, 0) >= count for api, count in calls.items()):
+                planned.append(location)
+                for api, count in calls.items():
+                    budget[api] -= count
+
+        logger.info(f"Planned {len(planned)} of {len(coordinates)} locations, budget left: {budget}")
+
+        return planned
+
+
+class QuotaLease(object):
+    """
+    Hands out shares of each API's monthly quota to workers through a lease file.
+
+    Workers sharing the file, i.e ETL shards on the same volume, reserve calls before making them and release them
+    once they're made. A reservation only fits if the calls already made this month, from the usage ledger, plus the
+    calls other workers have reserved but not made yet leave room for it, so the workers never go over the quota. The
+    app's calls only count if it records them into the same ledger, i.e on the volume the manifests share between the
+    app and the ETL. The reservations reset at the start of every month.
+    """
+
+    def __init__(
+        self, path: str = os.environ.get("QUOTA_LEASE_PATH", Config.QUOTA_LEASE_PATH), ledger: UsageLedger = None
+    ):
+        self.path = os.path.expanduser(path)
+        self.ledger = ledger or get_usage_ledger()
+
+    def acquire(self, calls: Dict[str, int]) -> bool:
+        """
+        Reserves calls against the quota of each API, either all of them or none.
+
+        Args:
+            calls (Dict[str, int]): Number of calls to reserve per API, i.e {"realtor": 1, "google_maps": 3}.
+
+        Returns:
+            bool: True if the calls were reserved, False if any API would go over its quota.
+        """
+
+        with file_lock(self.path):
+            reserved = self._read()
+            usage = self.ledger.get_total_usage()
+
+            for api, count in calls.items():
+                if usage.get(api, 0) + reserved.get(api, 0) + count > get_monthly_quota(api):
+                    logger.warning(
+                        f"Not enough {api} quota left for {count} calls, {usage.get(api, 0)} used and "
+                        f"{reserved.get(api, 0)} reserved"
+                    )
+                    return False
+
+            for api, count in calls.items():
+                reserved[api] = reserved.get(api, 0) + count
+
+            write_json_atomic(self.path, {"period": self._get_period(), "reserved": reserved})
+
+        return True
+
+    def release(self, calls: Dict[str, int]):
+        """
+        Releases reserved calls once they've been made, or won't be, since the calls made are in the usage ledger.
+
+        Args:
+            calls (Dict[str, int]): Number of calls to release per API, the same as were acquired.
+        """
+
+        with file_lock(self.path):
+            reserved = self._read()
+
+            for api, count in calls.items():
+                reserved[api] = max(reserved.get(api, 0) - count, 0)
+
+            write_json_atomic(self.path, {"period": self._get_period(), "reserved": reserved})
+
+    def get_reserved(self) -> Dict[str, int]:
+        """
+        Gets the number of calls reserved but not released this month for each API.
+
+        Returns:
+            Dict[str, int]: Reserved calls per API.
+        """
+
+        with file_lock(self.path):
+            return self._read()
+
+    def _read(self) -> Dict[str, int]:
+        """Reads this month's reservations from the lease file."""
+
+        if not os.path.exists(self.path):
+            return {}
+
+        with open(self.path) as f:
+            lease = json.load(f)
+
+        return lease["reserved"] if lease["period"] == self._get_period() else {}
+
+    @staticmethod
+    def _get_period() -> str:
+        return datetime.now().strftime("%Y-%m")
@@ -0,0 +1,49 @@
+import hashlib
+from typing import Dict, List
+
+from real_estate_hub.utils import normalize_location
+
+
+def shard_locations(locations: List[str], num_shards: int) -> List[List[str]]:
+    """
+    Splits locations into shards for the ETL to process in parallel.
+
+    Locations are assigned by a hash of their normalized form so spellings of the same place always land in the same
+    shard, and a location stays in the same shard between runs.
+
+    Args:
+        locations (List[str]): Locations to split, may contain duplicates.
+        num_shards (int): Number of shards to split into.
+
+    Returns:
+        List[List[str]]: Non empty shards of unique locations, in the order they were passed in.
+    """
+
+    shards = [[] for _ in range(num_shards)]
+
+    for location in dict.fromkeys(locations):
+        shard = int(hashlib.sha1(normalize_location(location).encode()).hexdigest(), 16) % num_shards
+        shards[shard].append(location)
+
+    return [shard for shard in shards if shard]
+
+
+def merge_shard_stats(shard_stats: List[Dict[str, int]]) -> Dict[str, int]:
+    """
+    Merges the stats of every shard, i.e how many locations each one processed and indexed.
+
+    Args:
+        shard_stats (List[Dict[str, int]]): Stats of each shard.
+
+    Returns:
+        Dict[str, int]: Summed stats, with the number of locations `skipped` because they couldn't be processed.
+    """
+
+    stats = {}
+    for shard in shard_stats:
+        for stat, value in shard.items():
+            stats[stat] = stats.get(stat, 0) + value
+
+    stats["skipped"] = stats.get("locations", 0) - stats.get("processed", 0)
+
+    return stats
@@ -0,0 +1,229 @@
+import fcntl
+import json
+import os
+import re
+import string
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, List
+
+import numpy as np
+
+# Street suffixes are only expanded when they end an address component or come right before a locality, province or
+# postal code, so "St Clair Ave" keeps its "St".
+STREET_SUFFIX_ABBREVIATIONS = {
+    "ave": "avenue",
+    "av": "avenue",
+    "blvd": "boulevard",
+    "cres": "crescent",
+    "crt": "court",
+    "ct": "court",
+    "dr": "drive",
+    "hwy": "highway",
+    "ln": "lane",
+    "pkwy": "parkway",
+    "pl": "place",
+    "rd": "road",
+    "sq": "square",
+    "st": "street",
+    "ter": "terrace",
+    "terr": "terrace",
+}
+
+# Components that don't help identify a location since every search is already restricted to Ontario, Canada.
+REDUNDANT_LOCATION_COMPONENTS = {"canada", "ca", "ontario", "on"}
+
+# Localities that follow the street in addresses written without commas, i.e "1 Bedford Rd Toronto".
+LOCALITIES = [
+    "toronto",
+    "north york",
+    "east york",
+    "york",
+    "scarborough",
+    "etobicoke",
+    "mississauga",
+    "brampton",
+    "markham",
+    "vaughan",
+    "richmond hill",
+    "oakville",
+    "burlington",
+    "milton",
+    "pickering",
+    "ajax",
+    "whitby",
+    "oshawa",
+    "newmarket",
+    "aurora",
+    "hamilton",
+    "ottawa",
+]
+
+POSTAL_CODE_REGEX = re.compile(r"\b([a-z]\d[a-z])\s?(\d[a-z]\d)?\b", re.IGNORECASE)
+
+EARTH_RADIUS_METRES = 6_371_000
+
+
+def normalize_location(location: str) -> str:
+    """
+    Normalizes a free text location so different spellings of the same place compare equal.
+
+    Lowercases, strips punctuation, collapses whitespace, expands street suffixes and drops the province and country,
+    i.e "1 Bedford Rd., Toronto, ON", "1 Bedford Rd Toronto" and "1 bedford road toronto" all become
+    "1 bedford road toronto".
+
+    Args:
+        location (str): Location to normalize.
+
+    Returns:
+        str: Normalized location.
+    """
+
+    punctuation = string.punctuation.replace(",", "")
+    components = location.lower().translate(str.maketrans(punctuation, " " * len(punctuation))).split(",")
+
+    normalized_components = []
+    for component in components:
+        tokens = component.split()
+
+        if not tokens or " ".join(tokens) in REDUNDANT_LOCATION_COMPONENTS:
+            continue
+
+        while len(tokens) > 1 and tokens[-1] in REDUNDANT_LOCATION_COMPONENTS:
+            tokens.pop()
+
+        tokens = [
+            STREET_SUFFIX_ABBREVIATIONS.get(token, token)
+            if i == len(tokens) - 1 or (i > 0 and _starts_locality(tokens[i + 1 :]))
+            else token
+            for i, token in enumerate(tokens)
+        ]
+        normalized_components.append(" ".join(tokens))
+
+    return " ".join(normalized_components)
+
+
+def _starts_locality(tokens: List[str]) -> bool:
+    """Whether tokens start with a locality, the province or country, or a postal code."""
+
+    rest = " ".join(tokens)
+
+    return (
+        tokens[0] in REDUNDANT_LOCATION_COMPONENTS
+        or any(rest == locality or rest.startswith(f"{locality} ") for locality in LOCALITIES)
+        or POSTAL_CODE_REGEX.fullmatch(tokens[0]) is not None
+    )
+
+
+def get_fsa(location: str) -> str:
+    """
+    Gets the forward sortation area (first 3 characters of a postal code) from a location if it contains one.
+
+    Args:
+        location (str): Location to get the FSA from.
+
+    Returns:
+        str: Uppercase FSA, i.e "M4W", or None if the location doesn't contain a postal code.
+    """
+
+    match = POSTAL_CODE_REGEX.search(location)
+
+    return match.group(1).upper() if match else None
+
+
+def get_location_id(lat: float, long: float) -> str:
+    """
+    Gets the canonical id of a location from its coordinates, rounded to about a metre.
+
+    Args:
+        lat (float): Latitude of the location.
+        long (float): Longitude of the location.
+
+    Returns:
+        str: Location id, i.e "43.67898,-79.34491".
+    """
+
+    return f"{lat:.5f},{long:.5f}"
+
+
+def haversine_distance(lat1, long1, lat2, long2):
+    """
+    Great circle distance in metres between two points.
+
+    Works on scalars as well as numpy arrays, which are broadcast against each other.
+
+    Args:
+        lat1: Latitude of the first point(s).
+        long1: Longitude of the first point(s).
+        lat2: Latitude of the second point(s).
+        long2: Longitude of the second point(s).
+
+    Returns:
+        Distance in metres.
+    """
+
+    lat1, long1, lat2, long2 = map(np.radians, (lat1, long1, lat2, long2))
+
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((long2 - long1) / 2) ** 2
+
+    return 2 * EARTH_RADIUS_METRES * np.arcsin(np.sqrt(a))
+
+
+class RateLimiter(object):
+    """
+    Thread safe rate limiter that spaces out calls so at most `calls_per_second` are made.
+    """
+
+    def __init__(self, calls_per_second: float):
+        self.interval = 1.0 / calls_per_second
+        self._lock = threading.Lock()
+        self._next_call = time.monotonic()
+
+    def wait(self):
+        """Blocks until the next call is allowed."""
+
+        with self._lock:
+            now = time.monotonic()
+            wait_time = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+
+        if wait_time > 0:
+            time.sleep(wait_time)
+
+
+@contextmanager
+def file_lock(path: str):
+    """
+    Holds an exclusive lock on `path`.lock so processes sharing a file (or a volume) can update it one at a time.
+
+    Args:
+        path (str): Path of the file to lock.
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    with open(f"{path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_json_atomic(path: str, data: Any):
+    """
+    Writes JSON to a temporary file and moves it over `path` so readers never see a partially written file.
+
+    Args:
+        path (str): Path to write to.
+        data (Any): JSON serializable data.
+    """
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path) or ".", delete=False) as f:
+        json.dump(data, f, default=str)
+
+    os.replace(f.name, path)
@@ -0,0 +1,15 @@
+import pytest
+from elasticsearch import Elasticsearch
+
+from real_estate_hub.load_test.stand_ins import StandInElasticsearch
+
+
+@pytest.fixture
+def elasticsearch():
+    with StandInElasticsearch() as stand_in:
+        yield stand_in
+
+
+@pytest.fixture
+def es_client(elasticsearch):
+    return Elasticsearch(elasticsearch.url)
@@ -0,0 +1,116 @@
+import pytest
+
+from real_estate_hub.data_feeds import batch_geocoder
+from real_estate_hub.data_feeds.batch_geocoder import BatchGeocoder
+from real_estate_hub.quota import QuotaLease, UsageLedger
+
+
+@pytest.fixture
+def geocoder(tmp_path):
+    fsa_centroids_path = tmp_path / "fsa.csv"
+    fsa_centroids_path.write_text("fsa,latitude,longitude\nM4K,43.679,-79.352\n")
+
+    return BatchGeocoder(
+        google_api_key="test",
+        cache_path=str(tmp_path / "geocodes.json"),
+        fsa_centroids_path=str(fsa_centroids_path),
+        calls_per_second=1000,
+    )
+
+
+def geocode_response(lat, long):
+    return {
+        "status": "OK",
+        "results": [
+            {"formatted_address": "1 Bedford Rd, Toronto, ON", "geometry": {"location": {"lat": lat, "lng": long}}}
+        ],
+    }
+
+
+def test_geocode_deduplicates(geocoder, monkeypatch):
+    calls = []
+
+    def make_request(endpoint, params, google_api_key):
+        calls.append(params["address"])
+        return geocode_response(43.67, -79.39)
+
+    monkeypatch.setattr(batch_geocoder, "make_google_maps_request", make_request)
+
+    geocodes = geocoder.geocode(["1 Bedford Rd, Toronto", "1 bedford road toronto", "1 Bedford Rd, Toronto"])
+
+    assert len(calls) == 1
+    assert len(geocodes) == 2
+    assert all(
+        geocode
+        == {"latitude": 43.67, "longitude": -79.39, "formatted_address": "1 Bedford Rd, Toronto, ON", "exact": True}
+        for geocode in geocodes.values()
+    )
+
+
+def test_geocode_reuses_cache(geocoder, monkeypatch, tmp_path):
+    monkeypatch.setattr(batch_geocoder, "make_google_maps_request", lambda *args: geocode_response(43.67, -79.39))
+    geocoder.geocode(["1 Bedford Rd, Toronto"])
+
+    def fail(*args):
+        raise AssertionError("Cached location should not be geocoded")
+
+    monkeypatch.setattr(batch_geocoder, "make_google_maps_request", fail)
+    cached_geocoder = BatchGeocoder(google_api_key="test", cache_path=str(tmp_path / "geocodes.json"))
+
+    assert cached_geocoder.geocode(["1 bedford road, toronto, on"])["1 bedford road, toronto, on"] == {
+        "latitude": 43.67,
+        "longitude": -79.39,
+        "formatted_address": None,
+        "exact": True,
+    }
+    assert cached_geocoder.get_cached(["1 Bedford Rd, Toronto"]) == {"1 Bedford Rd, Toronto": (43.67, -79.39)}
+    assert cached_geocoder.api_calls == 0
+
+
+def test_geocode_falls_back_to_fsa_centroid(geocoder, monkeypatch):
+    monkeypatch.setattr(
+        batch_geocoder, "make_google_maps_request", lambda *args: {"status": "OVER_QUERY_LIMIT", "results": []}
+    )
+
+    geocodes = geocoder.geocode(["Riverdale M4K 1A1", "Somewhere Else"])
+
+    assert geocoder.api_exhausted
+    assert geocodes == {
+        "Riverdale M4K 1A1": {"latitude": 43.679, "longitude": -79.352, "formatted_address": None, "exact": False},
+        "Somewhere Else": None,
+    }
+    assert geocoder.cache == {}
+
+
+def test_geocode_leases_calls(geocoder, monkeypatch, tmp_path):
+    ledger = UsageLedger(str(tmp_path / "api_usage.jsonl"))
+
+    def make_google_maps_request(*args):
+        ledger.record("google_maps", "geocode")
+        return geocode_response(43.67, -79.39)
+
+    monkeypatch.setenv("GOOGLE_MAPS_MONTHLY_QUOTA", "1")
+    monkeypatch.setattr(batch_geocoder, "make_google_maps_request", make_google_maps_request)
+    geocoder.max_workers = 1
+    geocoder.quota_lease = QuotaLease(str(tmp_path / "quota_lease.json"), ledger)
+
+    geocodes = geocoder.geocode(["Somewhere Else", "Riverdale M4K 1A1"])
+
+    # The quota left covers one of the two calls, the other location falls back to its FSA centroid
+    assert geocoder.api_calls == 1
+    assert geocodes["Somewhere Else"]["exact"] is True
+    assert geocodes["Riverdale M4K 1A1"]["exact"] is False
+    assert geocoder.quota_lease.get_reserved() == {"google_maps": 0}
+
+
+def test_geocode_releases_leased_calls(geocoder, monkeypatch, tmp_path):
+    monkeypatch.setattr(batch_geocoder, "make_google_maps_request", lambda *args: geocode_response(43.67, -79.39))
+    geocoder.quota_lease = QuotaLease(
+        str(tmp_path / "quota_lease.json"), UsageLedger(str(tmp_path / "api_usage.jsonl"))
+    )
+
+    geocodes = geocoder.geocode(["Riverdale M4K 1A1", "Somewhere Else"])
+
+    assert geocoder.api_calls == 2
+    assert all(geocode["exact"] for geocode in geocodes.values())
+    assert geocoder.quota_lease.get_reserved() == {"google_maps": 0}
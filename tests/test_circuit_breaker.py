@@ -0,0 +1,74 @@
+import pytest
+
+from real_estate_hub.circuit_breaker import CircuitBreaker, CircuitOpenError, upstreams_available
+
+
+def fail():
+    raise ConnectionError("upstream down")
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+
+
+def test_opens_after_threshold(breaker):
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+
+    assert breaker.is_open
+    assert breaker.seconds_until_retry() > 0
+
+
+def test_rejects_calls_while_open(breaker):
+    calls = []
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+
+    with pytest.raises(CircuitOpenError):
+        breaker.call(calls.append, 1)
+
+    assert calls == []
+
+
+def test_success_resets_failures(breaker):
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+
+    assert breaker.call(lambda: "ok") == "ok"
+
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+
+    assert not breaker.is_open
+
+
+def test_trial_call_closes_breaker(breaker):
+    breaker.reset_timeout = 0
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+
+    assert breaker.call(lambda: "ok") == "ok"
+    assert breaker.opened_at is None
+
+
+def test_failed_trial_reopens_breaker(breaker):
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(fail)
+
+    breaker.opened_at -= 60
+
+    with pytest.raises(ConnectionError):
+        breaker.call(fail)
+
+    assert breaker.is_open
+
+
+def test_upstreams_available():
+    assert upstreams_available(["google_maps", "realtor"])
@@ -0,0 +1,68 @@
+import pytest
+
+from real_estate_hub.compare import align_profiles, fetch_profiles, pivot_section, plot_section
+from real_estate_hub.location_aliases import LocationAliasIndex
+
+
+def profile(general, incomes, lat=43.67, long=-79.34):
+    return {
+        "location": "ignored",
+        "latitude": lat,
+        "longitude": long,
+        "location_stats": {
+            "asof_date": "2022-01-28",
+            "Data": [
+                {"key": "General", "value": [{"key": "Average Household Income", "value": general}]},
+                {"key": "Distance", "value": []},
+                {"key": "Age", "value": []},
+                {"key": "Forecast", "value": []},
+                {"key": "Education", "value": []},
+                {"key": "Marital", "value": []},
+                {"key": "Language", "value": []},
+                {"key": "Income", "value": [{"key": k, "value": v} for k, v in incomes.items()]},
+            ],
+        },
+    }
+
+
+@pytest.fixture
+def profiles():
+    return {
+        "Riverdale": profile("$100,000.00", {"$0 - $29,999": "10", "$200,000+": "30"}),
+        "Leslieville": profile("$80,000.00", {"$0 - $29,999": "20", "$200,000+": "5"}, 43.66, -79.33),
+    }
+
+
+def test_fetch_profiles(elasticsearch, es_client, profiles):
+    es_client.indices.create(index="location_stats")
+    for location, location_profile in profiles.items():
+        es_client.index(index="location_stats", document={**location_profile, "location": location})
+
+    alias_index = LocationAliasIndex(es_client)
+    alias_index.create_index()
+    alias_index.register(["Riverdale, Toronto"], 43.67, -79.34)
+    requests = elasticsearch.requests
+
+    fetched = fetch_profiles(es_client, ["Leslieville", "Nowhere", "riverdale toronto on"])
+
+    assert set(fetched) == {"Leslieville", "riverdale toronto on"}
+    # One request to resolve the aliases and one to search
+    assert elasticsearch.requests - requests == 2
+
+
+def test_align_and_pivot(profiles):
+    stats = align_profiles(profiles)
+
+    income = pivot_section(stats, "income")
+    assert list(income.columns) == ["Riverdale", "Leslieville"]
+    assert list(income.index) == ["$0 - $29,999", "$200,000+"]
+    assert income.loc["$200,000+"].tolist() == [30, 5]
+
+    assert pivot_section(stats, "income", normalize=True)["Riverdale"].tolist() == [0.25, 0.75]
+    assert pivot_section(stats, "general_stats", values="value")["Leslieville"].tolist() == ["$80,000.00"]
+
+
+def test_plot_section(profiles):
+    fig = plot_section(align_profiles(profiles), "income", "Household Income")
+
+    assert [trace.name for trace in fig.data] == ["Riverdale", "Leslieville"]
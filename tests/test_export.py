@@ -0,0 +1,53 @@
+from datetime import date, datetime
+
+import pytest
+
+from real_estate_hub.data_feeds.location_stats import flatten_location_doc
+from real_estate_hub.export import export_location_docs, load_location_stats
+
+
+def location_doc(location, income_count):
+    return {
+        "location": location,
+        "latitude": 43.678985,
+        "longitude": -79.3449101,
+        "location_stats": {
+            "asof_date": "2022-01-28",
+            "Data": [
+                {"key": "General", "value": [{"key": "Average Household Income", "value": "$568,818.60"}]},
+                {"key": "Distance", "value": [{"key": "< 1", "value": "26"}]},
+                {"key": "Age", "value": [{"key": "0 - 4 years old", "value": "22"}]},
+                {"key": "Forecast", "value": []},
+                {"key": "Education", "value": []},
+                {"key": "Marital", "value": []},
+                {"key": "Language", "value": []},
+                {"key": "Income", "value": [{"key": "$200,000+", "value": str(income_count)}]},
+            ],
+        },
+        "processed_date": datetime(2022, 1, 30, 12),
+    }
+
+
+def test_flatten_location_doc():
+    rows = flatten_location_doc(location_doc("Riverdale", 24))
+
+    assert [row["section"] for row in rows] == ["general_stats", "section_1", "age_distribution", "income"]
+    assert rows[0]["location"] == "Riverdale"
+    assert rows[0]["asof_date"] == "2022-01-28"
+
+
+@pytest.mark.parametrize("export_format", ["parquet", "ipc"])
+def test_export_and_load(tmp_path, export_format):
+    path = str(tmp_path / "location_stats")
+    docs = [location_doc("Riverdale", 24), location_doc("Leslieville", 12)]
+
+    assert export_location_docs(iter(docs), path, export_format=export_format, batch_size=3) == 8
+
+    df = load_location_stats(path, export_format=export_format)
+    assert len(df) == 8
+    assert df["asof_date"].iloc[0] == date(2022, 1, 28)
+    assert df.loc[df["key"] == "Average Household Income", "numeric_value"].tolist() == [568818.60, 568818.60]
+
+    income = load_location_stats(path, export_format=export_format, sections=["income"])
+    assert sorted(income["numeric_value"]) == [12, 24]
+    assert set(income["section"]) == {"income"}
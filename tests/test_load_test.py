@@ -0,0 +1,105 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from real_estate_hub.data_feeds.nearby_places_index import NearbyPlacesIndex
+from real_estate_hub.load_test.harness import AppLookupFlow, LoadTest, get_breaking_point
+from real_estate_hub.load_test.stand_ins import StubUpstreams, matches
+from real_estate_hub.location_aliases import LocationAliasIndex
+from real_estate_hub.profiles import get_location_queries, search_profiles
+
+RIVERDALE = {
+    "location": "Riverdale, Toronto",
+    "latitude": 43.678985,
+    "longitude": -79.3449101,
+    "processed_date": datetime.now().isoformat(),
+    "location_stats": {"asof_date": "2022-01-10"},
+}
+
+
+def test_matches_app_profile_query():
+    stale_riverdale = {**RIVERDALE, "processed_date": (datetime.now() - timedelta(days=60)).isoformat()}
+    query = {
+        "bool": {
+            "should": get_location_queries("riverdale", RIVERDALE),
+            "minimum_should_match": 1,
+            "filter": [{"range": {"processed_date": {"gte": "now-31d"}}}],
+        }
+    }
+
+    assert matches(RIVERDALE, query)
+    assert matches({**RIVERDALE, "location": "Somewhere Else"}, query)
+    assert not matches({**RIVERDALE, "location": "Somewhere Else", "latitude": 43.0}, query)
+    assert not matches(stale_riverdale, query)
+
+
+def test_stand_in_serves_elasticsearch_client(es_client):
+    es_client.indices.create(index="location_stats")
+    es_client.index(index="location_stats", document={**RIVERDALE, "location_stats": {"asof_date": "2021-01-10"}})
+    es_client.index(index="location_stats", document=RIVERDALE)
+
+    hits = search_profiles(es_client, get_location_queries("Riverdale"), max_age="31d")["hits"]["hits"]
+
+    assert len(hits) == 1
+    assert hits[0]["_source"]["location_stats"]["asof_date"] == "2022-01-10"
+
+
+def test_stand_in_serves_alias_index(es_client):
+    alias_index = LocationAliasIndex(es_client)
+    alias_index.create_index()
+    alias_index.create_index()
+
+    location_id = alias_index.register(["Riverdale, Toronto"], RIVERDALE["latitude"], RIVERDALE["longitude"])
+
+    assert alias_index.resolve("riverdale toronto ON")["location_id"] == location_id
+    assert set(alias_index.resolve_many(["Riverdale, Toronto", "Leslieville"])) == {"Riverdale, Toronto"}
+
+
+def test_lookup_flow_caches_profiles(elasticsearch, es_client, tmp_path, monkeypatch):
+    with StubUpstreams() as stubs:
+        for name, url in stubs.env.items():
+            monkeypatch.setenv(name, url)
+
+        flow = AppLookupFlow(es_client, NearbyPlacesIndex(str(tmp_path / "nearby_places.json")), "key", "key")
+
+        first = flow.lookup("1 Stand-in Street, Toronto")
+        requests = dict(stubs.requests)
+        second = flow.lookup("1 stand-in street toronto")
+
+    assert first["latitude"] == second["latitude"]
+    assert first["commute_times"]["driving_commute_time"].endswith("mins")
+    # Zolo is scraped for every spelling, like the app caches it by the address entered
+    assert {endpoint: count for endpoint, count in stubs.requests.items() if endpoint != "/zolo"} == {
+        endpoint: count for endpoint, count in requests.items() if endpoint != "/zolo"
+    }
+    assert elasticsearch.count("location_stats") == 1
+
+
+def test_run_stage_reports_latency_and_errors():
+    def lookup(location):
+        if location == "1":
+            raise ValueError("bad location")
+
+    load_test = LoadTest(lookup, [str(number) for number in range(1000)], repeat_ratio=0.5, seed=1)
+
+    stage = load_test.run_stage(sessions=2, duration=0.2)
+
+    assert stage["lookups"] > stage["errors"] > 0
+    assert stage["top_error"] == "ValueError"
+    assert stage["p50"] <= stage["p95"] <= stage["p99"]
+
+
+def test_breaking_point():
+    stages = pd.DataFrame(
+        [
+            {"sessions": 1, "error_rate": 0.0, "p95": 0.2, "throughput": 5.0},
+            {"sessions": 2, "error_rate": 0.0, "p95": 0.3, "throughput": 9.0},
+            {"sessions": 4, "error_rate": 0.0, "p95": 0.5, "throughput": 16.0},
+            {"sessions": 8, "error_rate": 0.0, "p95": 1.5, "throughput": 16.5},
+        ]
+    )
+
+    assert get_breaking_point(stages) == 8
+    assert get_breaking_point(stages.head(3)) is None
+    assert get_breaking_point(stages.head(3), max_p95=0.4) == 4
+    assert get_breaking_point(stages.assign(error_rate=[0, 0.5, 0, 0])) == 2
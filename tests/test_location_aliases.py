@@ -0,0 +1,54 @@
+import pytest
+
+from real_estate_hub.location_aliases import LocationAliasIndex
+
+RIVERDALE = {"location_id": "43.67898,-79.34491", "latitude": 43.678985, "longitude": -79.3449101}
+
+
+@pytest.fixture
+def alias_index(es_client):
+    alias_index = LocationAliasIndex(es_client)
+    alias_index.create_index()
+    alias_index.register(["Riverdale, Toronto"], RIVERDALE["latitude"], RIVERDALE["longitude"])
+
+    return alias_index
+
+
+def test_resolve_normalizes_location(alias_index):
+    assert alias_index.resolve("Riverdale, Toronto, ON")["location_id"] == RIVERDALE["location_id"]
+    assert alias_index.resolve("Leslieville, Toronto") is None
+
+
+def test_resolve_many_is_one_request(alias_index, elasticsearch):
+    requests = elasticsearch.requests
+
+    resolved = alias_index.resolve_many(["Riverdale, Toronto", "riverdale toronto ontario", "Leslieville"])
+
+    assert set(resolved) == {"Riverdale, Toronto", "riverdale toronto ontario"}
+    assert elasticsearch.requests - requests == 1
+
+
+def test_resolve_without_alias_index(es_client):
+    alias_index = LocationAliasIndex(es_client)
+
+    assert alias_index.resolve("Riverdale, Toronto") is None
+    assert alias_index.resolve_many(["Riverdale, Toronto"]) == {}
+
+
+def test_register_upserts_every_alias(alias_index, elasticsearch):
+    location_id = alias_index.register(
+        ["Riverdale, Toronto", "riverdale toronto", "Riverdale, Toronto, Ontario"],
+        43.678985,
+        -79.3449101,
+        formatted_address="Riverdale, Toronto, ON",
+    )
+    aliases = elasticsearch.indices[alias_index.index]
+
+    assert location_id == RIVERDALE["location_id"]
+    assert set(aliases) == {"riverdale toronto"}
+    assert aliases["riverdale toronto"]["formatted_address"] == "Riverdale, Toronto, ON"
+
+    # Registering without a formatted address keeps the stored one
+    alias_index.register(["Riverdale, Toronto"], 43.678985, -79.3449101)
+
+    assert aliases["riverdale toronto"]["formatted_address"] == "Riverdale, Toronto, ON"
@@ -0,0 +1,139 @@
+import json
+import os
+
+import pytest
+
+from real_estate_hub.data_feeds.google_geo import GoogleGeo, classify_place_types
+from real_estate_hub.data_feeds.nearby_places_index import NearbyPlacesIndex, get_journal_path
+
+CENTRE = (43.6790, -79.3520)
+
+
+def place(place_id, name, lat, long, place_type):
+    return {"place_id": place_id, "name": name, "lat": lat, "long": long, "type": place_type}
+
+
+@pytest.fixture
+def places_index():
+    places_index = NearbyPlacesIndex()
+    places_index.add_places(
+        *CENTRE,
+        [
+            place("a", "Riverdale Park", 43.6795, -79.3525, "park"),
+            place("b", "Cafe", 43.6800, -79.3500, "cafe"),
+            place("c", "Far Cafe", 43.6900, -79.3520, "cafe"),
+            place("d", "Office", 43.6785, -79.3515, None),
+        ],
+    )
+
+    return places_index
+
+
+def test_classify_place_types():
+    assert classify_place_types(("point_of_interest", "park", "establishment")) == "park"
+    assert classify_place_types(("point_of_interest", "establishment")) is None
+
+
+def test_add_places_deduplicates(places_index):
+    added = places_index.add_places(
+        *CENTRE, [place("a", "Riverdale Park", 43.6795, -79.3525, "park"), place("e", "CAFE", 43.68, -79.35, "cafe")]
+    )
+
+    assert added == 0
+    assert len(places_index) == 4
+
+
+def test_is_covered(places_index):
+    assert places_index.is_covered(*CENTRE, 500)
+    assert places_index.is_covered(43.6800, -79.3520, 500)
+    assert not places_index.is_covered(43.7500, -79.4000, 500)
+
+
+def test_query(places_index):
+    assert [p["name"] for p in places_index.query(*CENTRE, 500)] == ["Riverdale Park", "Cafe"]
+    assert [p["name"] for p in places_index.query(*CENTRE, 2000, place_type="cafe")] == ["Cafe", "Far Cafe"]
+
+
+def test_count_amenities(places_index):
+    counts = places_index.count_amenities({"Riverdale": CENTRE, "North": (43.6900, -79.3520)}, 500)
+
+    assert counts.loc["Riverdale"].to_dict() == {"cafe": 1, "park": 1}
+    assert counts.loc["North"].to_dict() == {"cafe": 1, "park": 0}
+
+
+def test_save_and_load(places_index, tmp_path):
+    path = str(tmp_path / "nearby_places.json")
+    places_index.save(path)
+
+    loaded = NearbyPlacesIndex(path)
+
+    assert len(loaded) == len(places_index)
+    assert loaded.is_covered(*CENTRE, 500)
+
+
+def test_append_only_writes_new_places(places_index, tmp_path):
+    path = str(tmp_path / "nearby_places.json")
+    places_index.save(path)
+    places_index.add_places(43.7000, -79.4000, [place("e", "New Cafe", 43.7001, -79.4001, "cafe")])
+
+    assert places_index.append(path) == 1
+    assert places_index.append(path) == 0
+
+    with open(get_journal_path(path)) as f:
+        assert [[p["place_id"] for p in json.loads(line)["places"]] for line in f] == [["e"]]
+
+    loaded = NearbyPlacesIndex(path)
+
+    assert len(loaded) == len(places_index)
+    assert loaded.is_covered(43.7000, -79.4000, 10)
+
+
+def test_save_folds_in_the_journal(tmp_path):
+    path = str(tmp_path / "nearby_places.json")
+    app_index = NearbyPlacesIndex(path)
+    app_index.add_places(*CENTRE, [place("a", "Riverdale Park", 43.6795, -79.3525, "park")])
+    app_index.append()
+
+    etl_index = NearbyPlacesIndex(path)
+    etl_index.add_places(43.7000, -79.4000, [place("e", "New Cafe", 43.7001, -79.4001, "cafe")])
+    etl_index.save()
+
+    assert not os.path.exists(get_journal_path(path))
+    assert set(NearbyPlacesIndex(path).places) == {"a", "e"}
+
+
+def test_is_covered_across_cells():
+    places_index = NearbyPlacesIndex(cell_size=0.001)
+    places_index.add_places(*CENTRE, [place("a", "Riverdale Park", 43.6890, -79.3520, "park")])
+
+    # Query centres in cells away from the search centre's cell but inside the covered circle
+    assert places_index.is_covered(43.6830, -79.3560, 500)
+    assert not places_index.is_covered(43.6870, -79.3520, 500)
+    assert places_index._coverage_grid[places_index._get_cell(43.7500, -79.4000)] == []
+
+
+def test_api_and_index_return_the_same_places(places_index, monkeypatch):
+    response = {
+        "status": "OK",
+        "results": [
+            {
+                "place_id": place_id,
+                "name": name,
+                "geometry": {"location": {"lat": lat, "lng": long}},
+                "types": [place_type, "point_of_interest"],
+            }
+            for place_id, name, lat, long, place_type in [
+                ("a", "Riverdale Park", 43.6795, -79.3525, "park"),
+                ("b", "Cafe", 43.6800, -79.3500, "cafe"),
+                ("c", "Far Cafe", 43.6900, -79.3520, "cafe"),
+            ]
+        ],
+    }
+    location = GoogleGeo("Riverdale, Toronto", *CENTRE, "key", NearbyPlacesIndex())
+    monkeypatch.setattr(location, "make_request", lambda endpoint, params: response)
+
+    from_api = location.get_nearby_places()
+    location.places_index = places_index
+    from_index = location.get_nearby_places()
+
+    assert from_api == from_index == [{"Type": "Park", "Name": "Riverdale Park"}, {"Type": "Cafe", "Name": "Cafe"}]
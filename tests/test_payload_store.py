@@ -0,0 +1,80 @@
+import pytest
+
+from real_estate_hub import payload_store
+from real_estate_hub.payload_store import PayloadStore, hash_payload
+
+STATS = {
+    "ErrorCode": {"Id": 200, "ProductName": "Realtor.ca API | Monday, January 10, 2022 12:00:00 PM"},
+    "Data": [{"name": "general_stats", "value": [{"key": "Population", "value": "12,345"}] * 50}],
+    "asof_date": "2022-01-10",
+}
+
+
+def make_profile(location, **stats):
+    return {"location": location, "latitude": 43.67, "longitude": -79.34, "location_stats": {**STATS, **stats}}
+
+
+@pytest.fixture(autouse=True)
+def clear_payload_cache():
+    payload_store._payload_cache.clear()
+
+
+@pytest.fixture
+def store(es_client):
+    store = PayloadStore(es_client)
+    store.create_index()
+
+    return store
+
+
+def test_hash_ignores_volatile_fields():
+    next_day = {**STATS, "ErrorCode": {"Id": 200, "ProductName": "Realtor.ca API | Tuesday, January 11, 2022"}}
+
+    assert hash_payload(STATS) == hash_payload({**next_day, "asof_date": "2022-01-11"})
+    assert hash_payload(STATS) != hash_payload({**STATS, "Data": []})
+
+
+def test_dehydrate_stores_unique_payloads_once(store, elasticsearch):
+    docs = [
+        make_profile("Riverdale"),
+        make_profile("Riverdale", asof_date="2022-02-10"),
+        make_profile("Leslieville", Data=[]),
+    ]
+
+    dehydrated = store.dehydrate(docs)
+
+    assert elasticsearch.count(store.index) == 2
+    assert dehydrated[0]["location_stats"] == {"asof_date": "2022-01-10", "payload_hash": hash_payload(STATS)}
+    assert dehydrated[1]["location_stats"]["payload_hash"] == dehydrated[0]["location_stats"]["payload_hash"]
+    assert dehydrated[1]["location_stats"]["asof_date"] == "2022-02-10"
+    assert "Data" in docs[0]["location_stats"]
+
+    stored = elasticsearch.indices[store.index][hash_payload(STATS)]
+    assert stored["compressed_size"] < stored["size"]
+
+
+def test_hydrate_round_trips_payloads(store):
+    dehydrated = store.dehydrate([make_profile("Riverdale"), {"location": "Old Profile", "location_stats": STATS}])
+    payload_store._payload_cache.clear()
+
+    hydrated = store.hydrate(dehydrated + [make_profile("Leslieville")])
+
+    assert hydrated[0]["location_stats"] == {"Data": STATS["Data"], "asof_date": "2022-01-10"}
+    assert hydrated[1]["location_stats"] == hydrated[0]["location_stats"]
+    assert hydrated[2] == make_profile("Leslieville")
+
+
+def test_hydrate_hits(store):
+    results = {"hits": {"hits": [{"_id": "1", "_source": store.dehydrate([make_profile("Riverdale")])[0]}]}}
+
+    assert store.hydrate_hits(results)["hits"]["hits"][0]["_source"]["location_stats"]["Data"] == STATS["Data"]
+
+
+def test_hydrate_without_payload_index(es_client):
+    store = PayloadStore(es_client)
+    profile = make_profile("Riverdale", payload_hash="missing")
+
+    hydrated = store.hydrate([profile])[0]
+
+    assert "location_stats" not in hydrated
+    assert hydrated["location"] == "Riverdale"
@@ -0,0 +1,181 @@
+import functools
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from real_estate_hub import circuit_breaker, profiles
+from real_estate_hub.circuit_breaker import get_circuit_breaker
+from real_estate_hub.data_feeds.google_geo import GoogleGeo
+from real_estate_hub.data_feeds.location_stats import LocationStatsGenerator
+from real_estate_hub.data_feeds.nearby_places_index import NearbyPlacesIndex
+from real_estate_hub.data_feeds.web.zolo_scraper import ZoloScraper
+from real_estate_hub.load_test.stand_ins import StubUpstreams
+from real_estate_hub.location_aliases import LocationAliasIndex
+from real_estate_hub.payload_store import PayloadStore
+from real_estate_hub.profiles import PROFILE_UPSTREAMS, ProfileUnavailableError, get_missing_fields, lookup_profile
+
+
+@pytest.fixture
+def es_client(es_client):
+    es_client.indices.create(index="location_stats")
+    LocationAliasIndex(es_client).create_index()
+    PayloadStore(es_client).create_index()
+
+    return es_client
+
+
+@pytest.fixture(autouse=True)
+def circuit_breakers(monkeypatch):
+    monkeypatch.setattr(circuit_breaker, "_circuit_breakers", {})
+
+
+def open_circuit_breakers(reset_timeout=60):
+    for name in PROFILE_UPSTREAMS:
+        breaker = get_circuit_breaker(name)
+        breaker.reset_timeout = reset_timeout
+        breaker.opened_at = time.monotonic()
+
+
+def lookup(es_client, location, places_index):
+    return lookup_profile(
+        es_client,
+        location,
+        places_index,
+        lambda location, lat=None, long=None: GoogleGeo(location, lat, long, "key", places_index),
+        lambda lat, long: LocationStatsGenerator(lat, long, "key"),
+        ZoloScraper,
+        rapid_api_key="key",
+    )
+
+
+def test_spellings_geocoding_to_the_same_address_share_a_profile(elasticsearch, es_client, tmp_path, monkeypatch):
+    places_index = NearbyPlacesIndex(str(tmp_path / "nearby_places.json"))
+
+    with StubUpstreams(addresses={"1 Bedford Rd": "One Bedford Road, Toronto"}) as stubs:
+        for name, url in stubs.env.items():
+            monkeypatch.setenv(name, url)
+
+        first = lookup(es_client, "One Bedford Road, Toronto", places_index)
+        requests = dict(stubs.requests)
+        second = lookup(es_client, "1 Bedford Rd", places_index)
+
+    assert (second["profile"]["latitude"], second["profile"]["longitude"]) == (
+        first["profile"]["latitude"],
+        first["profile"]["longitude"],
+    )
+    assert elasticsearch.count("location_stats") == 1
+    # Only the new spelling is geocoded, the stats come from the existing profile
+    assert stubs.requests["/maps/api/geocode/json"] == requests["/maps/api/geocode/json"] + 1
+    assert stubs.requests["/realtor/properties/get-statistics"] == requests["/realtor/properties/get-statistics"]
+    assert LocationAliasIndex(es_client).resolve("1 bedford rd")["location_id"] == first["profile"]["location_id"]
+
+
+def test_phrase_matches_are_not_aliased(es_client, tmp_path, monkeypatch):
+    places_index = NearbyPlacesIndex(str(tmp_path / "nearby_places.json"))
+
+    with StubUpstreams() as stubs:
+        for name, url in stubs.env.items():
+            monkeypatch.setenv(name, url)
+
+        first = lookup(es_client, "1 Bedford Road, Toronto", places_index)
+        second = lookup(es_client, "Toronto", places_index)
+
+    # The phrase match still serves the profile but doesn't tie "Toronto" to Bedford Road's coordinates for good
+    assert second["profile"]["location_id"] == first["profile"]["location_id"]
+    assert LocationAliasIndex(es_client).resolve("Toronto") is None
+    assert LocationAliasIndex(es_client).resolve("1 Bedford Road, Toronto") is not None
+
+
+def test_get_missing_fields():
+    profile = {
+        "location_stats": {"Data": []},
+        "nearby_places": [],
+        "commute_times": {"driving_commute_time": "20 mins", "transit_commute_time": "35 mins"},
+    }
+
+    assert get_missing_fields(profile) == []
+    assert get_missing_fields({**profile, "nearby_places": None}) == ["nearby_places"]
+    assert get_missing_fields(
+        {**profile, "commute_times": {**profile["commute_times"], "transit_commute_time": None}}
+    ) == ["transit_commute_time"]
+
+
+def test_incomplete_profiles_are_not_indexed(elasticsearch, es_client, tmp_path, monkeypatch):
+    places_index = NearbyPlacesIndex(str(tmp_path / "nearby_places.json"))
+    monkeypatch.setattr(GoogleGeo, "get_commute_time", lambda self, mode: None)
+    monkeypatch.setattr(profiles, "refresh_stale_profile", lambda *args: True)
+
+    with StubUpstreams() as stubs:
+        for name, url in stubs.env.items():
+            monkeypatch.setenv(name, url)
+
+        result = lookup(es_client, "1 Stand-in Street, Toronto", places_index)
+
+    assert result["profile"]["commute_times"] == {"driving_commute_time": None, "transit_commute_time": None}
+    assert elasticsearch.count("location_stats") == 0
+
+
+def test_stale_profile_is_served_while_providers_are_unavailable(elasticsearch, es_client, tmp_path, monkeypatch):
+    places_index = NearbyPlacesIndex(str(tmp_path / "nearby_places.json"))
+    refreshed = []
+    monkeypatch.setattr(profiles, "refresh_stale_profile", lambda *args: refreshed.append(args[1]))
+
+    with StubUpstreams() as stubs:
+        for name, url in stubs.env.items():
+            monkeypatch.setenv(name, url)
+
+        first = lookup(es_client, "1 Bedford Road, Toronto", places_index)
+
+        # Age the profile past PROFILE_MAX_AGE and take the providers down
+        processed_date = (datetime.now() - timedelta(days=60)).isoformat()
+        for doc in elasticsearch.indices["location_stats"].values():
+            doc["processed_date"] = processed_date
+        open_circuit_breakers()
+
+        second = lookup(es_client, "1 Bedford Road, Toronto", places_index)
+
+    assert second["stale"]
+    assert second["profile"]["processed_date"] == processed_date
+    assert second["location_stats"].location_data["Data"] == first["location_stats"].location_data["Data"]
+    assert refreshed == ["1 Bedford Road, Toronto"]
+    assert elasticsearch.count("location_stats") == 1
+
+
+def test_no_profile_to_fall_back_on(es_client, tmp_path, monkeypatch):
+    places_index = NearbyPlacesIndex(str(tmp_path / "nearby_places.json"))
+    open_circuit_breakers()
+
+    with StubUpstreams() as stubs:
+        for name, url in stubs.env.items():
+            monkeypatch.setenv(name, url)
+
+        with pytest.raises(ProfileUnavailableError):
+            lookup(es_client, "1 Bedford Road, Toronto", places_index)
+
+
+def test_stale_profile_is_refreshed_once_the_circuit_closes(elasticsearch, es_client, tmp_path, monkeypatch):
+    places_index = NearbyPlacesIndex(str(tmp_path / "nearby_places.json"))
+    monkeypatch.setattr(profiles, "GoogleGeo", functools.partial(GoogleGeo, google_api_key="key"))
+    monkeypatch.setattr(
+        profiles, "LocationStatsGenerator", functools.partial(LocationStatsGenerator, rapid_api_key="key")
+    )
+    open_circuit_breakers(reset_timeout=0.5)
+
+    with StubUpstreams() as stubs:
+        for name, url in stubs.env.items():
+            monkeypatch.setenv(name, url)
+
+        assert profiles.refresh_stale_profile(es_client, "1 Bedford Road, Toronto", 43.67, -79.39, places_index)
+        # Only one refresh runs per location
+        assert not profiles.refresh_stale_profile(es_client, "1 Bedford Road, Toronto", 43.67, -79.39, places_index)
+        assert elasticsearch.count("location_stats") == 0
+
+        deadline = time.monotonic() + 10
+        while not elasticsearch.count("location_stats") and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    (doc,) = elasticsearch.indices["location_stats"].values()
+
+    assert doc["location_id"] == "43.67000,-79.39000"
+    assert profiles.upstreams_available(PROFILE_UPSTREAMS)
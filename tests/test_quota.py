@@ -0,0 +1,125 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from real_estate_hub.data_feeds.nearby_places_index import NearbyPlacesIndex
+from real_estate_hub.quota import QuotaLease, QuotaPlanner, UsageLedger
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return UsageLedger(str(tmp_path / "api_usage.jsonl"))
+
+
+@pytest.fixture
+def quota_lease(tmp_path, ledger, monkeypatch):
+    monkeypatch.setenv("REALTOR_MONTHLY_QUOTA", "3")
+
+    return QuotaLease(str(tmp_path / "quota_lease.json"), ledger)
+
+
+def test_acquire_within_quota(quota_lease):
+    assert quota_lease.acquire({"realtor": 1, "google_maps": 5})
+    assert quota_lease.acquire({"realtor": 2})
+    assert quota_lease.get_reserved() == {"realtor": 3, "google_maps": 5}
+
+
+def test_acquire_is_all_or_nothing(quota_lease):
+    assert quota_lease.acquire({"realtor": 3})
+    assert not quota_lease.acquire({"google_maps": 1, "realtor": 1})
+    assert quota_lease.get_reserved() == {"realtor": 3}
+
+
+def test_lease_is_shared(quota_lease):
+    other_worker = QuotaLease(quota_lease.path, quota_lease.ledger)
+
+    assert quota_lease.acquire({"realtor": 2})
+    assert not other_worker.acquire({"realtor": 2})
+
+
+def test_reservations_reset_every_month(quota_lease):
+    with open(quota_lease.path, "w") as f:
+        json.dump({"period": "2000-01", "reserved": {"realtor": 3}}, f)
+
+    assert quota_lease.get_reserved() == {}
+    assert quota_lease.acquire({"realtor": 3})
+
+
+def test_acquire_counts_calls_already_made(quota_lease, ledger):
+    ledger.record("realtor", "properties/get-statistics", calls=2)
+
+    assert not quota_lease.acquire({"realtor": 2})
+    assert quota_lease.acquire({"realtor": 1})
+
+
+def test_release_swaps_reservations_for_usage(quota_lease, ledger):
+    assert quota_lease.acquire({"realtor": 2})
+
+    # Only one of the two reserved calls was made
+    ledger.record("realtor", "properties/get-statistics")
+    quota_lease.release({"realtor": 2})
+
+    assert quota_lease.get_reserved() == {"realtor": 0}
+    assert quota_lease.acquire({"realtor": 2})
+    assert not quota_lease.acquire({"realtor": 1})
+
+
+def test_ledger_records_usage(ledger):
+    ledger.record("google_maps", "geocode")
+    ledger.record("google_maps", "directions", calls=2)
+    ledger.record("realtor", "properties/get-statistics")
+
+    assert ledger.get_usage() == {
+        "google_maps": {"geocode": 1, "directions": 2},
+        "realtor": {"properties/get-statistics": 1},
+    }
+    assert ledger.get_total_usage() == {"google_maps": 3, "realtor": 1}
+    assert ledger.get_usage(period="2000-01") == {}
+
+
+def test_ledger_writes_a_file_per_month(ledger, tmp_path):
+    with open(ledger.get_period_path("2000-01"), "w") as f:
+        f.write(json.dumps({"timestamp": "2000-01-01T00:00:00", "api": "realtor", "endpoint": "stats", "calls": 5}))
+
+    ledger.record("realtor", "properties/get-statistics")
+
+    assert ledger.get_period_path("2000-01") == str(tmp_path / "api_usage-2000-01.jsonl")
+    assert ledger.get_total_usage() == {"realtor": 1}
+    assert ledger.get_total_usage(period="2000-01") == {"realtor": 5}
+
+
+def test_budget_subtracts_usage(ledger, monkeypatch):
+    monkeypatch.setenv("REALTOR_MONTHLY_QUOTA", "10")
+    ledger.record("realtor", "properties/get-statistics", calls=4)
+
+    assert QuotaPlanner(ledger).get_budget(spread_over_month=False)["realtor"] == 6
+
+
+def test_estimate_calls_uses_caches(ledger):
+    places_index = NearbyPlacesIndex()
+    places_index.add_places(
+        43.679, -79.352, [{"place_id": "a", "name": "Far", "lat": 43.7, "long": -79.352, "type": None}]
+    )
+    planner = QuotaPlanner(ledger, places_index=places_index)
+
+    assert planner.estimate_calls(None) == {"realtor": 1, "google_maps": 6}
+    assert planner.estimate_calls((43.6, -79.4)) == {"realtor": 1, "google_maps": 5}
+    assert planner.estimate_calls((43.679, -79.352)) == {"realtor": 1, "google_maps": 2}
+    assert planner.estimate_total_calls({"a": None, "b": (43.679, -79.352)}) == {"realtor": 2, "google_maps": 8}
+
+
+def test_plan_prioritizes_stale_valuable_locations(ledger):
+    planner = QuotaPlanner(ledger)
+    coordinates = {"fresh": (43.6, -79.4), "stale": (43.7, -79.4), "valuable": (43.8, -79.4), "never": (43.9, -79.4)}
+    last_processed = {
+        "fresh": datetime.now() - timedelta(days=1),
+        "stale": datetime.now() - timedelta(days=60),
+        "valuable": datetime.now() - timedelta(days=30),
+    }
+
+    planned = planner.plan(
+        coordinates, last_processed, values={"valuable": 10}, budget={"realtor": 3, "google_maps": 100}
+    )
+
+    assert planned == ["never", "valuable", "stale"]
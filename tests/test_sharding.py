@@ -0,0 +1,36 @@
+from real_estate_hub.sharding import merge_shard_stats, shard_locations
+
+LOCATIONS = ["1 Bedford Rd, Toronto", "Riverdale, Toronto", "Leslieville", "M4K 1A1", "100 Queen St W, Toronto"]
+
+
+def test_shard_locations_is_stable():
+    shards = shard_locations(LOCATIONS, 3)
+
+    assert shard_locations(list(reversed(LOCATIONS)), 3) == [list(reversed(shard)) for shard in shards]
+    assert sorted(location for shard in shards for location in shard) == sorted(LOCATIONS)
+    assert all(shards)
+
+
+def test_shard_locations_colocates_spellings():
+    spellings = ["1 Bedford Rd, Toronto", "1 bedford road toronto", "1 BEDFORD RD., Toronto, ON"]
+
+    for num_shards in range(1, 8):
+        shards = shard_locations(LOCATIONS + spellings, num_shards)
+
+        assert sum(any(spelling in shard for spelling in spellings) for shard in shards) == 1
+
+
+def test_shard_locations_deduplicates():
+    assert shard_locations(["Leslieville", "Leslieville"], 4) == [["Leslieville"]]
+
+
+def test_merge_shard_stats():
+    stats = merge_shard_stats(
+        [
+            {"shards": 1, "locations": 3, "processed": 3, "indexed": 3},
+            {"shards": 1, "locations": 4, "processed": 2, "indexed": 1},
+        ]
+    )
+
+    assert stats == {"shards": 2, "locations": 7, "processed": 5, "indexed": 4, "skipped": 2}
+    assert merge_shard_stats([]) == {"skipped": 0}
@@ -0,0 +1,35 @@
+import pytest
+
+from real_estate_hub.utils import get_fsa, normalize_location
+
+
+@pytest.mark.parametrize(
+    "location",
+    [
+        "1 Bedford Rd., Toronto, ON",
+        "1 bedford road toronto",
+        "1  BEDFORD RD, Toronto, Ontario, Canada",
+        "1 Bedford Rd Toronto",
+        "1 Bedford Rd Toronto ON",
+    ],
+)
+def test_normalize_location(location):
+    assert normalize_location(location) == "1 bedford road toronto"
+
+
+def test_normalize_location_keeps_leading_abbreviation():
+    assert normalize_location("St Clair Ave W") == "st clair ave w"
+    assert normalize_location("100 St Clair Ave") == "100 st clair avenue"
+    assert normalize_location("100 St Clair Ave North York") == "100 st clair avenue north york"
+    assert normalize_location("St Clair Ave Toronto") == "st clair avenue toronto"
+
+
+def test_normalize_location_without_commas():
+    assert normalize_location("1 Bedford Rd M5R 2J7") == normalize_location("1 Bedford Rd, M5R 2J7")
+    assert normalize_location("12 Main St Ontario") == "12 main street"
+
+
+def test_get_fsa():
+    assert get_fsa("1 Bedford Rd, Toronto, ON M5R 2J7") == "M5R"
+    assert get_fsa("m4k") == "M4K"
+    assert get_fsa("Riverdale, Ontario") is None